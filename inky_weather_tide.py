@@ -15,6 +15,9 @@ Python program for fetching weather info on openweather web server and tide info
 
 HISTORY:
 --------
+17/10/26:
+- Fonts loaded by init_display through the registry of mm_fonts, instead of at import (not loaded in print mode)
+
 17/2/19:
 - Split fetching weather, forecast and tide info from the main program to display the info
 
@@ -121,6 +124,7 @@ except:
 	print("No inky")
 
 import inky_IP, weather_tide
+import mm_fonts
 
 #-------------------------------------------------
 #--- DEFINITIONS ---------------------------------
@@ -165,10 +169,9 @@ icon_mapping = {
 	"50n": "myst"  
 }
 
-if has_inky:
-	font18 = inkyphat.ImageFont.truetype(inkyphat.fonts.FredokaOne, 18)
-	font20 = inkyphat.ImageFont.truetype(inkyphat.fonts.FredokaOne, 20)
-	font24 = inkyphat.ImageFont.truetype(inkyphat.fonts.FredokaOne, 24)
+font18 = None  # Loaded by init_display, only when the info is displayed on the screen
+font20 = None
+font24 = None
 
 rotate = True
 
@@ -280,11 +283,16 @@ def decode_arg(argv):
 
 def init_display(rotate):
 	global icons, masks
+	global font18, font20, font24
 
 	if not has_inky:
 		print("Information for %s:" % (city))
 		return
 
+	font18 = mm_fonts.get_font(inkyphat.fonts.FredokaOne, 18)
+	font20 = mm_fonts.get_font(inkyphat.fonts.FredokaOne, 20)
+	font24 = mm_fonts.get_font(inkyphat.fonts.FredokaOne, 24)
+
 	if rotate:
 		inkyphat.set_rotation(180)
 
@@ -25,6 +25,18 @@ Information displayed includes:
 
 HISTORY:
 --------
+17/10/26:
+- Tide, weather, forecast and calendar info fetched in parallel
+- Added -daemon mode, with an in-process scheduler refreshing each info on its own interval
+- Refresh policy per info (REFRESH_POLICIES), only the info which are due are fetched, including in cron mode (state saved in STATE_FILENAME)
+- Retries of the fetching share a time budget per refresh (mm_data.REFRESH_BUDGET), failed info keeping their previous values
+- Added -backend option to render without the Inky panel (memory or PNG/PBM file)
+- Rendering skipped when the content to display is the same as the last frame (FINGERPRINT_FILENAME), the time of the title excepted
+- Timings of each refresh (fetchers, retries, HTTP requests, display) saved by mm_metrics in its metrics file
+- Logging through the buffered logger of mm_log (background writer, level set in the optional [LOG] section of the config)
+- Sunrise and sunset computed offline by mm_ephem when latitude and longitude are set in the [LOCATION] section of the config
+- State, fingerprint and last frame of the backends other than the Inky panel kept in their own files (see backend_files)
+
 20/7/20:
 - Added config file
 - Cleanup of the code
@@ -43,6 +55,8 @@ python magicmirror.py [-city city [countrycode]] [-h] [-v] [-tidename Name] [-we
 	-h: Display help info
 	-v: Verbose mode
 	-p: Print only mode (no display on Inky)
+	-daemon: Keep running and refresh each info on its own interval (instead of one refresh per launch)
+	-backend name: Output of the screen: inky (default), memory, or a .png or .pbm file name (to run without the Inky panel)
 	-info: Display screen with IP info before weather
 	-tide: Display daily tide info in place of current weather
 	-tidename: Name to be used when fetching tide info (if different from city)
@@ -71,6 +85,10 @@ In the crontab:
 
 python magicmirror.py -city Ouessant -weathername Brest -tidename OUESSANT -wind
 
+Or, in daemon mode, a single launch at boot:
+
+@reboot sudo python /home/pi/Magic/magicmirror.py -city Paris -daemon
+
 
 PREREQUISITS:
 ------------
@@ -91,7 +109,19 @@ Requires the following standard modules:
 Requires the following sub-programs and files:
 - panic.py : to prevent re-entering of the code
 - mm_data : to fetch weather, tide and calendar information 
+- mm_http : shared HTTP session (keep-alive, connection pool, timeouts) used by mm_data
+- mm_credentials : Google credentials, refreshed before they expire
+- mm_ephem : sunrise, sunset and civil twilight computed offline at the configured coordinates
+- mm_tide : local tide prediction from the harmonic constants of the ports (resources/tide_ports.json)
+- mm_calendar : local store of the Google calendar events, synchronised incrementally
 - mm_display : to display information on the inky HAT / wHAT
+- mm_backend : output of the screen (Inky panel, memory or PNG/PBM file)
+- mm_scheduler : to refresh each info on its own interval in daemon mode
+- mm_atlas : to precompile the icons into an atlas (python mm_atlas.py)
+- mm_fonts : to load the fonts on first use
+- mm_layout : to compute the position of every element of the screen from resources/layout.json
+- mm_log : buffered logger shared by the sub-programs
+- mm_metrics : to measure the stages of each refresh (python mm_metrics.py for a summary of the last ones)
 - config_magicmirror.conf : configuration data
 
 Installation of the lib:
@@ -100,13 +130,13 @@ Installation of the lib:
 
 SIDE EFFECTS:
 ------------
-Logs to LOG_FILENAME results (or errors) of the program and displays it if verbose mode
+Logs to mm_log.LOG_FILENAME results (or errors) of the program and displays it if verbose mode
 
 
 KNOWN BUGS:
 ----------
 - Sometimes get_location returns '' as location, and hence the forecast displayed is for city_default
-- TIDE_URL works only for some cities on the French West coast and returns no data if the city is not recognised (and sometimes the name should be CAPITALIZED) -- hence the option to force a city name with -tidename (list of cities here: http://www.horaire-maree.fr/)
+- TIDE_URL (used for the ports without harmonic constants in resources/tide_ports.json) works only for some cities on the French West coast and returns no data if the city is not recognised (and sometimes the name should be CAPITALIZED) -- hence the option to force a city name with -tidename (list of cities here: http://www.horaire-maree.fr/)
 - OPENWEATHER server works only for some cities and returns no data if the city is not recognised -- hence the option to force a city name with -weathername (list of cities is here: http://bulk.openweathermap.org/sample/city.list.json.gz)
 
 """
@@ -119,9 +149,18 @@ KNOWN BUGS:
 
 from time import strftime, sleep
 import sys
+import threading
+import re
+from hashlib import sha1
+from json import dumps
 from datetime import datetime
 import mm_data
 import mm_display
+import mm_ephem
+import mm_http
+import mm_log
+import mm_metrics
+import mm_scheduler
 from os import path
 import panic
 from configparser import ConfigParser
@@ -132,7 +171,6 @@ from configparser import ConfigParser
 #-------------------------------------------------
 
 PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
-LOG_FILENAME = PATH_PREFIX + "log_magicmirror.log"
 CONFIG_FILENAME = PATH_PREFIX + 'config_magicmirror.conf'
 
 HELP = """
@@ -140,6 +178,8 @@ python %s [-h][-city city[countrycode]][-v][-tidename Name][-weathername Name][-
 	-h: Display help info
 	-v: Verbose mode
 	-p: Print only mode(no display on Inky)
+	-daemon: Keep running and refresh each info on its own interval (instead of one refresh per launch)
+	-backend name: Output of the screen: inky (default), memory, or a .png or .pbm file name (to run without the Inky panel)
 	-info: Display screen with IP info before weather
 	-tide: Display daily tide info in place of current weather
 	-tidename: Name to be used when fetching tide info
@@ -149,10 +189,25 @@ python %s [-h][-city city[countrycode]][-v][-tidename Name][-weathername Name][-
 """
 
 verbose = False
+daemon_mode = False
+backend = 'inky'  # Output of the screen (see mm_backend)
 
 NB_FORECAST = 5  # Nb of days of forecast
 DELAY_INFO = 5  # Delay for displaying info in seconds
 
+STATE_FILENAME = PATH_PREFIX + 'state_magicmirror.pickle'  # For the Inky panel, see backend_files for the other backends
+FINGERPRINT_FILENAME = PATH_PREFIX + 'fingerprint_magicmirror.txt'
+
+last_fingerprint = None  # Fingerprint of the content of the last frame displayed
+
+REFRESH_POLICIES = {  # Refresh policy of each source, following how often its data changes
+	'weather': mm_scheduler.EveryPolicy(15 * 60),  # Current weather
+	'forecast': mm_scheduler.AlignedPolicy(3 * 3600),  # OpenWeather forecast has a 3-hour step
+	'tide': mm_scheduler.DailyPolicy(0),  # Only today's tides are fetched
+	'calendar': mm_scheduler.EveryPolicy(5 * 60)  # Screen redrawn only if events have changed
+}
+DAEMON_MIN_SLEEP = 10  # Min delay between two scheduler ticks in daemon mode, in seconds
+
 
 #-------------------------------------------------
 #--- FUNCTIONS -----------------------------------
@@ -162,26 +217,11 @@ DELAY_INFO = 5  # Delay for displaying info in seconds
 #		Useful functions
 #-------------------------------------------------
 
-def remove_non_ascii(text):
-	"""
-		Returns text where non-ascii chars have been removed
-	"""
-	if type(text) is unicode:
-		text = ''.join(i for i in text if ord(i) < 128)
-	return text
-
-
-def tolog(txt, forceprint = False):
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
 	"""
-		Logs events and prints it if forceprint = True
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
 	"""
-	txt = remove_non_ascii(txt)
-	if verbose or forceprint:
-		print(txt)
-	now = strftime('%Y/%m/%d %H:%M:%S')
-	msg = "%s\t%s" % (now, txt)
-	with open(LOG_FILENAME, 'a') as file:
-		file.write(msg + "\n")
+	mm_log.log(txt, verbose or forceprint, level, args)
 	return
 
 
@@ -189,7 +229,7 @@ def decode_arg(argv):
 	"""
 		Decoding of the shell arguments
 	"""
-	global verbose
+	global verbose, daemon_mode, backend
 
 	tolog("Decoding arguments...")
 	city = ''
@@ -218,6 +258,16 @@ def decode_arg(argv):
 		elif arg == '-p':  # Print only
 			no_display = False
 			tolog("No display_mm mode", True)
+		elif arg == '-daemon':  # Daemon mode
+			daemon_mode = True
+			tolog("Daemon mode", True)
+		elif arg == '-backend':  # Set output backend
+			if n+1 == length:
+				tolog("Error: param -backend should be followed by a name", True, mm_log.ERROR)
+			else:
+				backend = argv[n+1]
+				n += 1
+				tolog("Backend set as %s", True, args=(backend,))
 		elif arg == '-tide':    # Tide mode
 			tide_display = True
 			tolog("Tide display mode", True)
@@ -233,54 +283,54 @@ def decode_arg(argv):
 		elif arg == '-tidename':  # Set tide name
 			tide_display = True
 			if n == length:
-				tolog("Error: param -tidename should be followed by a name", True)
+				tolog("Error: param -tidename should be followed by a name", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("Error: param -tidename should be followed by a name", True)
+				tolog("Error: param -tidename should be followed by a name", True, mm_log.ERROR)
 			else:
 				tidename = argv[n+1]
 				if city == '':
 					city = tidename
 				n += 1
-				tolog("Set name for tide as %s" % (tidename), True)
+				tolog("Set name for tide as %s", True, args=(tidename,))
 		elif arg == '-day':  # Set day
 			if n == length:
-				tolog("Error: param -day should be followed by a date", True)
+				tolog("Error: param -day should be followed by a date", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("Error: param -day should be followed by a date", True)
+				tolog("Error: param -day should be followed by a date", True, mm_log.ERROR)
 			else:
 				today = argv[n+1]
 				n += 1
-				tolog("Set day as %s" % (today), True)
+				tolog("Set day as %s", True, args=(today,))
 		elif arg == '-weathername':  # Set weather name
 			if n == length:
-				tolog("Error: param -weathername should be followed by a name", True)
+				tolog("Error: param -weathername should be followed by a name", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("Error: param -weathername should be followed by a name", True)
+				tolog("Error: param -weathername should be followed by a name", True, mm_log.ERROR)
 			else:
 				weathername = argv[n+1]
 				n += 1
 				if city == '':
 					city = weathername
-				tolog("Set name for weather as %s" % (weathername))
+				tolog("Set name for weather as %s", args=(weathername,))
 		elif arg == '-city':  # Set city name
 			if n == length:
-				tolog("Error: param -city should be followed by a name", True)
+				tolog("Error: param -city should be followed by a name", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("Error: param -city should be followed by a name", True)
+				tolog("Error: param -city should be followed by a name", True, mm_log.ERROR)
 			else:
 				n += 1
 				city = argv[n]
-				tolog("Set city name as %s" % (city), True)
+				tolog("Set city name as %s", True, args=(city,))
 				if n+1 < length:
 					if not argv[n+1][0] == '-':
 						n += 1
 						country = argv[n]
-						tolog("Set country name as %s" % (country), True)
+						tolog("Set country name as %s", True, args=(country,))
 		elif arg == '-noweather':
 			weather_display = False
 			tolog("No weather displayed", True)
 		elif arg[0] == '-':
-			tolog("Errorenous option: %s" % (arg), True)
+			tolog("Errorenous option: %s", True, mm_log.ERROR, (arg,))
 		n += 1
 	return city, country, info_display, tide_display, weather_display, wind_display, no_display, iss, tidename, weathername, today
 
@@ -314,8 +364,14 @@ def load_config():
 
 		openweather_ID = config.get('OPENWEATHER', 'openWeatherID')
 
+		# HTTP parameters
+
+		mm_http.load_config(config)
+		mm_log.load_config(config)
+		mm_ephem.load_config(config)
+
 	except Exception as e:
-		tolog('...error reading config file %s, SORRY: %s' % (CONFIG_FILENAME, e), True)
+		tolog('...error reading config file %s, SORRY: %s', True, mm_log.ERROR, (CONFIG_FILENAME, e))
 		exit()
 	return
 
@@ -327,36 +383,38 @@ def load_config():
 def fetch_location():
 
 	tolog("Fetching location info...")
+	mm_data.start_refresh()
 	city, country = mm_data.retrieve_location()
 
 	if city == "":
-		tolog("...cannot retrieve location info, I settle for %s, %s" %(city_default, country_default))
+		tolog("...cannot retrieve location info, I settle for %s, %s", args=(city_default, country_default))
 		city = city_default
 		country = country_default
 	else:
-		tolog("...CITY = %s, COUNTRY = %s" %(city, country))
+		tolog("...CITY = %s, COUNTRY = %s", args=(city, country))
 	return city, country
 	
 
 def fetch_IP():
 
 	tolog("Fetching IP & info...")
+	mm_data.start_refresh()
 	local_IP, public_IP, cpu_temp, cpu_load = mm_data.retrieve_IP()
 
 	local_IP = "IP loc.: %s" % (local_IP)
-	tolog("...local IP : " + local_IP)
+	tolog("...local IP : %s", args=(local_IP,))
 
 	public_IP = "IP pub.: %s" % (public_IP)
-	tolog("...public IP : " + public_IP)
+	tolog("...public IP : %s", args=(public_IP,))
 
 	info_CPU = "CPU: T. {:2.0f} C, load {:2.0f} %".format(cpu_temp, cpu_load)
-	tolog("...CPU info : " + info_CPU)
+	tolog("...CPU info : %s", args=(info_CPU,))
 
 	return local_IP, public_IP, info_CPU
 
 
 def fetch_calendar(city, country, today):
-	tolog("Fetching calendar info for %s..." % (city))
+	tolog("Fetching calendar info for %s...", args=(city,))
 	month_cal, day_list = mm_data.get_cal(country)
 	monthname = mm_data.get_month(country)
 	if today == '':
@@ -365,7 +423,7 @@ def fetch_calendar(city, country, today):
 
 	i = 1
 	for event in event_list:
-		tolog("Event #%s: Date = %s, Start = %s, Summary = %s" % (i, event['date'], event['start'], event['summary']))
+		tolog("Event #%s: Date = %s, Start = %s, Summary = %s", args=(i, event['date'], event['start'], event['summary']))
 		i+= 1
 
 	return month_cal, day_list, monthname, today, event_list
@@ -373,59 +431,101 @@ def fetch_calendar(city, country, today):
 
 def fetch_tide(tide_city):
 
-	tolog("Fetching tide info for %s..." % (tide_city))
+	tolog("Fetching tide info for %s...", args=(tide_city,))
 	tide_hours, tide_coef = mm_data.retrieve_tide(tide_city)
 
-	if tide_coef == '' or tide_coef == '?':
+	if tide_coef == '':
 		tolog("...cannot retrieve tide info")
+		return mm_scheduler.FAILED
+
+	if tide_coef == '?':
+		tolog("...no tide info for today")
 	else:
-		tolog("...tide info for %s:" % (tide_city))
-		tolog("Tide coefficient: %s" % (tide_coef))
+		tolog("...tide info for %s:", args=(tide_city,))
+		tolog("Tide coefficient: %s", args=(tide_coef,))
 		if len(tide_hours) == 1:
-			tolog("Hightide time: %s" % (tide_hours[0]))
+			tolog("Hightide time: %s", args=(tide_hours[0],))
 		elif len(tide_hours) == 2:
-			tolog("First hightide time: %s" % (tide_hours[0]))
-			tolog("Second hightide time: %s" % (tide_hours[1]))
+			tolog("First hightide time: %s", args=(tide_hours[0],))
+			tolog("Second hightide time: %s", args=(tide_hours[1],))
 	return tide_hours, tide_coef
 
 
 def fetch_weather(weather_city, country):
 
-	tolog("Fetching weather info for %s (%s)..." % (weather_city, country))
+	tolog("Fetching weather info for %s (%s)...", args=(weather_city, country))
 	weather_data = mm_data.retrieve_weather(weather_city, country, openweather_ID)
 
 	if weather_data == {}:
 		tolog("...cannot retrieve weather info")
-	else:
-		tolog("...weather info:")
-		tolog("Weather time: %s" % (weather_data['time']))
-		tolog("Temperature: %s" % (weather_data['temp']))
-		tolog("Weather condition: %s (%s)" %(weather_data['condition_name'], weather_data['condition_code']))
+		return mm_scheduler.FAILED
+
+	tolog("...weather info:")
+	tolog("Weather time: %s", args=(weather_data['time'],))
+	tolog("Temperature: %s", args=(weather_data['temp'],))
+	tolog("Weather condition: %s (%s)", args=(weather_data['condition_name'], weather_data['condition_code']))
 	return weather_data
 
 
 def fetch_forecast(weather_city, country):
 
-	tolog("Fetching forecast info for %s (%s)..." % (weather_city, country))
+	tolog("Fetching forecast info for %s (%s)...", args=(weather_city, country))
 	forecast_data = mm_data.retrieve_forecast(weather_city, country, openweather_ID)
 
 	if forecast_data == {}:
 		tolog("...cannot retrieve forecast info")
-	else:
-		tolog("...forecast info:")
-		for day in range(NB_FORECAST):
-			daily_forecast = forecast_data[day]
-			for utc_time in daily_forecast['hours']:
-				tolog("For %s at %s: Weather is %s, temperature is %s" % (
-					daily_forecast['nameday'],
-					utc_time,
-					daily_forecast['hours'][utc_time]['condition_name'],
-					daily_forecast['hours'][utc_time]['temp'])
-				)
+		return mm_scheduler.FAILED
+
+	tolog("...forecast info:")
+	for day in range(NB_FORECAST):
+		daily_forecast = forecast_data[day]
+		for utc_time in daily_forecast['hours']:
+			tolog("For %s at %s: Weather is %s, temperature is %s", args=(
+				daily_forecast['nameday'],
+				utc_time,
+				daily_forecast['hours'][utc_time]['condition_name'],
+				daily_forecast['hours'][utc_time]['temp'])
+			)
 
 	return forecast_data
 
 
+def empty_calendar(country, today):
+	"""
+		Returns the calendar info without any event, used when the events cannot be fetched
+	"""
+	month_cal, day_list = mm_data.get_cal(country)
+	monthname = mm_data.get_month(country)
+	if today == '':
+		today = strftime("%-d")
+	return month_cal, day_list, monthname, today, []
+
+
+def fetch_concurrently(tasks):
+	"""
+		Runs in parallel threads the fetching tasks, given as a dict of name: (function, args, default),
+		and returns, once all of them are finished, a dict of name: result (mm_scheduler.FAILED if the function failed)
+	"""
+	results = {}
+
+	def run(name, function, args):
+		try:
+			results[name] = function(*args)
+		except Exception as e:
+			tolog("...error fetching %s info: %s", True, mm_log.ERROR, (name, e))
+			results[name] = mm_scheduler.FAILED
+
+	threads = []
+	for name in tasks:
+		function, args, default = tasks[name]
+		thread = threading.Thread(target=run, args=(name, function, args))
+		thread.start()
+		threads.append(thread)
+	for thread in threads:
+		thread.join()
+	return results
+
+
 def fetch_title(city, country):
 	week_day = mm_data.get_date(country)
 	title = city + ', ' + week_day + strftime(' %-d/%-m a %H:%M')
@@ -436,40 +536,146 @@ def fetch_title(city, country):
 #		Main function for shell command
 #-------------------------------------------------
 
-def magicmirror_main(city, country, info_display=False, tide_display=False, weather_display=True, wind_display=False, no_display=False, iss=False, rotate=True, tide_city='', weather_city='', today=''):
+def data_scheduler(city, country, tide_display, tide_city, weather_city, today):
+	"""
+		Returns the scheduler of the data sources, loaded with the state of the previous runs
+	"""
+	scheduler = mm_scheduler.Scheduler(STATE_FILENAME)
+	tasks = data_tasks(city, country, tide_display, tide_city, weather_city, today)
+	for name in tasks:
+		function, args, default = tasks[name]
+		scheduler.add(name, REFRESH_POLICIES[name], function, args, default)
+	return scheduler
 
-	if not no_display:
-		ok = mm_display.draw_init(rotate)
 
-	if info_display:
-		local_IP, public_IP, info_CPU = fetch_IP()
-		mm_display.display_IP(city, local_IP, public_IP, info_CPU)	
-		ok = mm_display.display_show()
-		sleep(DELAY_INFO)
+def refresh_data(scheduler):
+	"""
+		Fetches the sources which are due, returns True if some data has changed
+	"""
+	due = scheduler.tasks_due()
+	if not due:
+		tolog("No info to be refreshed")
+		return False
+	tolog("Refreshing %s...", args=(', '.join(sorted(due)),))
+	mm_data.start_refresh(revalidate=True)  # The sources are due: their expired cache entries are fetched
+	changed = scheduler.update(fetch_concurrently(due))
+	try:
+		scheduler.save()
+	except Exception as e:
+		tolog("...error saving scheduler state: %s", True, mm_log.ERROR, (e,))
+	return changed
 
-	if weather_city == '':
-		weather_city = city
 
+def data_tasks(city, country, tide_display, tide_city, weather_city, today):
+	"""
+		Returns the dict of fetching tasks name: (function, args, default) for fetch_concurrently
+	"""
+	tasks = {
+		'weather': (fetch_weather, (weather_city, country), {}),
+		'forecast': (fetch_forecast, (weather_city, country), {}),
+		'calendar': (fetch_calendar, (city, country, today), empty_calendar(country, today))
+	}
 	if tide_display:
-		if tide_city == '':
-			tide_city = city
-		tide_hours, tide_coef = fetch_tide(tide_city)
-		if tide_coef == '' or tide_coef == '?':
-			tide_display = False
+		tasks['tide'] = (fetch_tide, (tide_city,), ([], ''))
+	return tasks
+
+
+def backend_files(backend):
+	"""
+		Sets the files of the state of the screen (scheduler state, fingerprint and last frame) for backend, so that
+		the runs without the panel do not overwrite the ones of the Inky panel: the state of the 'memory' backend
+		is only kept in memory, the one of a file backend is saved in files suffixed with the name of its output file
+	"""
+	global STATE_FILENAME, FINGERPRINT_FILENAME
+
+	if backend in ('', 'inky'):
+		return
+	if backend == 'memory':
+		STATE_FILENAME = FINGERPRINT_FILENAME = mm_display.LAST_FRAME_FILENAME = None
+		return
+	suffix = '_' + re.sub(r'[^A-Za-z0-9]+', '_', path.basename(backend.replace('file:', '', 1)))
+	STATE_FILENAME = PATH_PREFIX + 'state_magicmirror' + suffix + '.pickle'
+	FINGERPRINT_FILENAME = PATH_PREFIX + 'fingerprint_magicmirror' + suffix + '.txt'
+	mm_display.LAST_FRAME_FILENAME = PATH_PREFIX + 'last_frame' + suffix + '.png'
+	return
 
-	weather_data = fetch_weather(weather_city, country)
-	forecast_data = fetch_forecast(weather_city, country)
-	month_cal, day_list, monthname, today, event_list = fetch_calendar(city, country, today)
+
+def content_fingerprint(content):
+	"""
+		Returns a fingerprint of the content to be displayed (normalized as sorted JSON)
+	"""
+	return sha1(dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def same_as_last_frame(fingerprint):
+	"""
+		Tests if fingerprint is the one of the last frame displayed (kept in memory, or saved by a previous run)
+	"""
+	global last_fingerprint
+
+	if last_fingerprint is None and FINGERPRINT_FILENAME is not None and path.exists(FINGERPRINT_FILENAME):
+		try:
+			with open(FINGERPRINT_FILENAME, 'r') as file:
+				last_fingerprint = file.read().strip()
+		except Exception as e:
+			tolog("...error reading last fingerprint: %s", True, mm_log.ERROR, (e,))
+	return fingerprint == last_fingerprint
+
+
+def save_fingerprint(fingerprint):
+	"""
+		Records fingerprint as the one of the last frame displayed
+	"""
+	global last_fingerprint
+
+	last_fingerprint = fingerprint
+	if FINGERPRINT_FILENAME is None:
+		return
+	try:
+		with open(FINGERPRINT_FILENAME, 'w') as file:
+			file.write(fingerprint)
+	except Exception as e:
+		tolog("...error saving fingerprint: %s", True, mm_log.ERROR, (e,))
+	return
+
+
+def display_data(city, country, data, tide_display, wind_display):
+	"""
+		Displays on the screen the data fetched by the tasks of data_tasks,
+		unless the content is the same as the one of the last frame displayed
+	"""
+	weather_data = data['weather']
+	forecast_data = data['forecast']
+	month_cal, day_list, monthname, today, event_list = data['calendar']
 	title = fetch_title(city, country)
+	ephem_data = mm_ephem.get_ephem()  # Computed offline at the configured coordinates
+	if ephem_data is None:
+		ephem_data = weather_data  # Sunrise and sunset of openweather
+
+	if tide_display:
+		tide_hours, tide_coef = data['tide']
+		if tide_coef == '' or tide_coef == '?':
+			tide_display = False
 
-	if no_display:
+	content = {
+		'title': (city, country, strftime('%Y/%m/%d')),  # Without the clock of the title, which changes every minute
+		'weather': weather_data,
+		'forecast': forecast_data,
+		'calendar': [month_cal, monthname, today, event_list],
+		'tide': data['tide'] if tide_display else None,
+		'ephem': None if tide_display else ephem_data,
+		'wind_display': wind_display
+	}
+	fingerprint = content_fingerprint(content)
+	if same_as_last_frame(fingerprint):
+		tolog("Content unchanged since last frame, display skipped")
 		return True
 
 	ok = mm_display.init_display(wind_display)
 	if tide_display:
 		ok = mm_display.display_tide(tide_hours, tide_coef, country)
 	else:
-		ok = mm_display.display_ephem(weather_data, country)
+		ok = mm_display.display_ephem(ephem_data, country)
 	ok = mm_display.display_weather(weather_data, wind_display)
 	ok = mm_display.display_forecast(forecast_data, wind_display)
 
@@ -479,17 +685,98 @@ def magicmirror_main(city, country, info_display=False, tide_display=False, weat
 	ok = mm_display.display_calendar(month_cal, day_list, monthname, today, event_list, wind_display)
 	ok = mm_display.display_title(title)
 	ok = mm_display.display_show()
+	if ok:
+		save_fingerprint(fingerprint)
+
+	return ok
+
 
+def display_info(city):
+	"""
+		Displays the screen with IP and CPU info
+	"""
+	local_IP, public_IP, info_CPU = fetch_IP()
+	mm_display.display_IP(city, local_IP, public_IP, info_CPU)
+	ok = mm_display.display_show()
+	save_fingerprint('')	# The screen no longer shows the last frame
+	sleep(DELAY_INFO)
 	return ok
 
 
+def magicmirror_main(city, country, info_display=False, tide_display=False, weather_display=True, wind_display=False, no_display=False, iss=False, rotate=True, tide_city='', weather_city='', today='', backend='inky'):
+
+	backend_files(backend)
+	mm_metrics.start_run()  # The initialisation of the screen is measured with the (first) refresh
+	if not no_display:
+		ok = mm_display.draw_init(rotate, backend)
+
+	if info_display:
+		display_info(city)
+
+	if weather_city == '':
+		weather_city = city
+	if tide_city == '':
+		tide_city = city
+
+	scheduler = data_scheduler(city, country, tide_display, tide_city, weather_city, today)
+	refresh_data(scheduler)
+
+	ok = True
+	if not no_display:
+		ok = display_data(city, country, scheduler.data(), tide_display, wind_display)
+	mm_metrics.end_run()
+	return ok
+
+
+#-------------------------------------------------
+#		Main function for daemon mode
+#-------------------------------------------------
+
+def magicmirror_daemon(city, country, info_display=False, tide_display=False, weather_display=True, wind_display=False, no_display=False, iss=False, rotate=True, tide_city='', weather_city='', today='', backend='inky'):
+	"""
+		Runs forever, refreshing each source according to its policy (REFRESH_POLICIES),
+		and redrawing the screen only when the data has changed
+		Fonts, icons, HTTP session and Google credentials stay loaded between refreshes
+	"""
+
+	backend_files(backend)
+	mm_metrics.start_run()  # The initialisation of the screen is measured with the (first) refresh
+	if not no_display:
+		ok = mm_display.draw_init(rotate, backend)
+
+	if info_display:
+		display_info(city)
+
+	if weather_city == '':
+		weather_city = city
+	if tide_city == '':
+		tide_city = city
+
+	scheduler = data_scheduler(city, country, tide_display, tide_city, weather_city, today)
+	redraw = True
+
+	try:
+		while True:
+			if refresh_data(scheduler) or redraw:
+				if not no_display:
+					display_data(city, country, scheduler.data(), tide_display, wind_display)
+					tolog("...screen redrawn")
+				redraw = False
+			mm_metrics.end_run()
+			sleep(max(DAEMON_MIN_SLEEP, scheduler.next_delay()))
+			mm_metrics.start_run()
+	except KeyboardInterrupt:
+		tolog("Daemon stopped", True)
+	return True
+
+
 if __name__ == "__main__":
 
 	tolog("*** Info display start ***", True)
 
 	ok, err = panic.test_panic(False)
 	if not ok:
-		tolog(err, True)
+		tolog(err, True, mm_log.ERROR)
 		sys.exit()
 
 	load_config()
@@ -499,17 +786,21 @@ if __name__ == "__main__":
 	if city == "":
 		city, country = fetch_location()
 
-	ok = magicmirror_main(city, country, info_display, tide_display, weather_display,
-	                      wind_display, no_display, iss, rotate, tidename, weathername, today)
+	if daemon_mode:
+		ok = magicmirror_daemon(city, country, info_display, tide_display, weather_display,
+		                        wind_display, no_display, iss, rotate, tidename, weathername, today, backend)
+	else:
+		ok = magicmirror_main(city, country, info_display, tide_display, weather_display,
+		                      wind_display, no_display, iss, rotate, tidename, weathername, today, backend)
 
 	if ok:
-		tolog("Weather info for %s in %s displayed ; enjoy !" % (city, country), True)
+		tolog("Weather info for %s in %s displayed ; enjoy !", True, args=(city, country))
 	else:
-		tolog("Coulnd't display weather info for %s in %s ; sorry !" % (city, country), True)
+		tolog("Coulnd't display weather info for %s in %s ; sorry !", True, mm_log.ERROR, (city, country))
 
 	ok, err = panic.delete_panic()
 	if not ok:
-		tolog(err, True)
+		tolog(err, True, mm_log.ERROR)
 
 
 #-------------------------------------------------
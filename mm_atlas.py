@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_atlas.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_atlas.py"
+
+"""
+Version: 17/10/26
+
+Precompiles the icons of the magic mirror into a single atlas file, already in the palette of the wHAT panel,
+so that loading and drawing the icons need no PNG decoding nor conversion
+
+The atlas is a binary file made of:
+- a header: ATLAS_MAGIC, nb of icons (unsigned short)
+- for each icon: name (ATLAS_NAME_SIZE bytes, padded with zeros), width, height (unsigned shorts), offset of its pixels (unsigned int)
+- the pixels of the icons, one byte per pixel holding the panel palette index (WHITE, BLACK or RED)
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+
+
+USAGE:
+-----
+From the shell (to be run again each time an icon is added or modified in resources/):
+python mm_atlas.py [-v]
+
+From another python program:
+build_atlas(): builds ATLAS_FILENAME from the icons ICON_SOURCE listed in mm_display.ICON_MAPPING
+load_atlas(): returns the dict name: icon image, read from ATLAS_FILENAME through a memory map,
+	or None if the atlas is missing or older than one of the icons
+
+
+PREREQUISITS:
+------------
+Requires in current directory a subdirectory /resources with the icon PNG files
+
+Installation of the lib:
+	pip install pillow
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from glob import glob
+from mmap import mmap, ACCESS_READ
+from os import path, rename
+from struct import calcsize, pack, unpack_from
+from sys import argv
+
+from PIL import Image
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+ICON_SOURCE = PATH_PREFIX + "resources/icon-*.png"
+ATLAS_FILENAME = PATH_PREFIX + "resources/icons.atlas"
+
+ATLAS_MAGIC = b'MMATLAS1'
+ATLAS_NAME_SIZE = 16
+ATLAS_HEADER = '<8sH'
+ATLAS_ENTRY = '<%dsHHI' % (ATLAS_NAME_SIZE)
+
+WHITE = 0  # Palette indexes of the wHAT panel
+BLACK = 1
+RED = 2
+PANEL_COLOURS = [(WHITE, (255, 255, 255)), (BLACK, (0, 0, 0)), (RED, (255, 0, 0))]
+
+verbose = False
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def nearest_index(colour):
+	"""
+		Returns the panel palette index whose colour is the nearest of the RGB colour
+	"""
+	distances = [(sum((a - b) ** 2 for a, b in zip(colour, rgb)), index) for index, rgb in PANEL_COLOURS]
+	return min(distances)[1]
+
+
+def to_panel(icon):
+	"""
+		Returns the pixels of icon as panel palette indexes (one byte per pixel)
+		Palette icons already using the panel indexes keep them, as they are pasted as is on the screen
+	"""
+	if icon.mode == 'P':
+		palette = icon.getpalette()
+		lut = []
+		for index in range(256):
+			if index in (WHITE, BLACK, RED):
+				lut.append(index)
+			else:
+				lut.append(nearest_index(palette[3 * index:3 * index + 3]))
+		return bytes(bytearray(lut[pixel] for pixel in bytearray(icon.tobytes())))
+
+	background = Image.new('RGBA', icon.size, (255, 255, 255, 255))
+	rgb = Image.alpha_composite(background, icon.convert('RGBA')).convert('RGB')
+	return bytes(bytearray(nearest_index(pixel) for pixel in rgb.getdata()))
+
+
+def icon_files():
+	"""
+		Returns the dict name: file of the icons used by mm_display
+	"""
+	from mm_display import ICON_MAPPING
+
+	files = {}
+	for icon in glob(ICON_SOURCE):
+		icon_name = icon.split("icon-")[1].replace(".png", "")
+		if icon_name in ICON_MAPPING.values():
+			files[icon_name] = icon
+	return files
+
+
+def build_atlas():
+	"""
+		Builds ATLAS_FILENAME from the icons files
+	"""
+	files = icon_files()
+	names = sorted(files)
+	data_offset = calcsize(ATLAS_HEADER) + len(names) * calcsize(ATLAS_ENTRY)
+
+	entries = b''
+	pixels = b''
+	for name in names:
+		icon = Image.open(files[name])
+		width, height = icon.size
+		entries += pack(ATLAS_ENTRY, name.encode('ascii'), width, height, data_offset + len(pixels))
+		pixels += to_panel(icon)
+		if verbose:
+			print("Icon %s (%s x %s) added" % (name, width, height))
+
+	with open(ATLAS_FILENAME + '.tmp', 'wb') as file:
+		file.write(pack(ATLAS_HEADER, ATLAS_MAGIC, len(names)))
+		file.write(entries)
+		file.write(pixels)
+	rename(ATLAS_FILENAME + '.tmp', ATLAS_FILENAME)
+	return names
+
+
+def atlas_up_to_date():
+	"""
+		Tests if the atlas exists and is more recent than all the icon files
+	"""
+	if not path.exists(ATLAS_FILENAME):
+		return False
+	atlas_time = path.getmtime(ATLAS_FILENAME)
+	for icon in glob(ICON_SOURCE):
+		if path.getmtime(icon) > atlas_time:
+			return False
+	return True
+
+
+def load_atlas():
+	"""
+		Returns the dict name: icon image ('P' mode, panel palette indexes) mapped from the atlas, or None
+	"""
+	if not atlas_up_to_date():
+		return None
+
+	with open(ATLAS_FILENAME, 'rb') as file:
+		atlas = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+	magic, count = unpack_from(ATLAS_HEADER, atlas, 0)
+	if magic != ATLAS_MAGIC:
+		return None
+
+	icons = {}
+	buffer = memoryview(atlas)
+	position = calcsize(ATLAS_HEADER)
+	for i in range(count):
+		name, width, height, offset = unpack_from(ATLAS_ENTRY, atlas, position)
+		position += calcsize(ATLAS_ENTRY)
+		name = name.rstrip(b'\0').decode('ascii')
+		icons[name] = Image.frombuffer('P', (width, height), buffer[offset:offset + width * height], 'raw', 'P', 0, 1)
+	return icons
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	verbose = '-v' in argv
+
+	names = build_atlas()
+	print("Atlas %s built with %s icons" % (ATLAS_FILENAME, len(names)))
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
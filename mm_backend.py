@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_backend.py						#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_backend.py"
+
+"""
+Version: 17/10/26
+
+Output backends of the magic mirror screen, so that the rendering of mm_display can run, be profiled and tested
+on any Linux box, without the Inky panel nor GPIO:
+- InkyBackend: the Inky wHAT panel (the inky lib is only imported when this backend is used)
+- MemoryBackend: keeps the frames shown in memory
+- FileBackend: writes each frame shown to a PNG or PBM file
+
+All backends offer the interface of the Inky driver used by mm_display: WHITE, BLACK, RED, set_image(image), show()
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+
+
+USAGE:
+-----
+From another python program:
+get_backend(name): returns the backend for name, which is:
+	'inky': Inky wHAT panel (default)
+	'memory': frames kept in memory (backend.frames)
+	'file:<filename>', or any name ending with .png or .pbm: frames written to filename
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from os import path
+from PIL import Image
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+WHITE = 0  # Palette indexes of the Inky panels
+BLACK = 1
+RED = 2
+
+INKY_COLOUR = 'black'
+
+PANEL_PALETTE = [255, 255, 255, 0, 0, 0, 255, 0, 0]  # RGB of WHITE, BLACK, RED, for the frames written to files
+
+
+#-------------------------------------------------
+#--- CLASSES -------------------------------------
+#-------------------------------------------------
+
+class InkyBackend(object):
+	"""
+		Inky wHAT panel
+	"""
+
+	def __init__(self, colour=INKY_COLOUR):
+		from inky import InkyWHAT
+
+		self.panel = InkyWHAT(colour)
+		self.WHITE = self.panel.WHITE
+		self.BLACK = self.panel.BLACK
+		self.RED = self.panel.RED
+
+	def __getattr__(self, name):
+		# Other features of the driver (eg partial update), if any
+		return getattr(self.panel, name)
+
+	def set_image(self, image):
+		self.panel.set_image(image)
+
+	def show(self):
+		self.panel.show()
+
+
+class MemoryBackend(object):
+	"""
+		Keeps in memory the frames shown
+	"""
+	WHITE = WHITE
+	BLACK = BLACK
+	RED = RED
+
+	def __init__(self):
+		self.image = None
+		self.frames = []
+
+	def set_image(self, image):
+		self.image = image.copy()
+
+	def show(self):
+		self.frames.append(self.image)
+
+
+class FileBackend(object):
+	"""
+		Writes each frame shown to filename, as PNG or, if filename ends with .pbm, as 1-bit PBM
+	"""
+	WHITE = WHITE
+	BLACK = BLACK
+	RED = RED
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.image = None
+
+	def set_image(self, image):
+		self.image = image.copy()
+
+	def show(self):
+		frame = self.image
+		frame.putpalette(PANEL_PALETTE + [255, 255, 255] * 253)
+		if self.filename.lower().endswith('.pbm'):
+			indexes = Image.frombytes('L', frame.size, frame.tobytes())
+			indexes.point(lambda index: 0 if index == BLACK else 255).convert('1').save(self.filename)
+		else:
+			frame.save(self.filename)
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def get_backend(name='inky'):
+	"""
+		Returns the backend for name (see module doc)
+	"""
+	if name in ('', 'inky'):
+		return InkyBackend()
+	if name == 'memory':
+		return MemoryBackend()
+	if name.startswith('file:'):
+		return FileBackend(name[len('file:'):])
+	if path.splitext(name)[1].lower() in ('.png', '.pbm'):
+		return FileBackend(name)
+	raise ValueError("Unknown display backend: %s" % (name))
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
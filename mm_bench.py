@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_bench.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_bench.py"
+
+"""
+Version: 17/10/26
+
+Benchmark of a refresh of the magic mirror, measuring each stage on its own:
+- fetching of the current weather, forecast, tide and calendar, through the shared HTTP session of mm_http
+- parsing of the responses (parse_weather, parse_forecast, parse_google_events)
+- each display_* function of mm_display (building of the draw operations of its widget), display_show, and
+  within display_show the drawing of each widget of the scene (render_<widget>), on the headless 'memory' backend
+
+The responses are recorded ones (FIXTURE_DIR), served by a local stand-in server started by the benchmark,
+so that the timings do not depend on the network nor on the upstream servers, and the Inky panel is not needed.
+The results are written as JSON, and can be compared to a baseline to catch the regressions of the refresh time
+(eg on the Pi Zero) before deployment.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Import times of the modules (including the lazy import of the Google stack) added to the results
+- Stand-in server threaded, so that the connections kept alive by mm_http do not block its shutdown
+- Drawing time of each widget of the scene (render_<widget>) added to the results
+
+
+USAGE:
+-----
+From the shell:
+python mm_bench.py [-h][-v][-n nb][-o file][-baseline file][-tolerance pc][-tide][-wind] with:
+	-h: Display help info
+	-v: Verbose mode
+	-n nb: Nb of refreshes measured (default NB_RUNS)
+	-o file: Write the results in file (default: printed)
+	-baseline file: Compare the results to the ones of a previous run, and exit with status 1 if a stage is slower
+	-tolerance pc: Max increase of the median time of a stage over the baseline, in percent (default TOLERANCE)
+	-tide: Display tide info instead of ephemerides
+	-wind: Display wind info
+
+The results hold, for each stage, the min, median, mean and max times in milliseconds over the refreshes,
+and for 'refresh', the ones of the whole refresh, and in 'imports', the import times in milliseconds of mm_http,
+mm_data, mm_display and of the Google stack (imported by mm_data only when the calendar is fetched from Google).
+
+
+PREREQUISITS:
+------------
+Requires in current directory the subdirectory bench/fixtures with the recorded responses:
+- weather.json, forecast.json: OpenWeather current weather and forecast
+- tide.html: horaire-maree page
+- calendar.json: Google Calendar API events list
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from json import dump, dumps, load
+from os import path, remove
+from sys import argv, exit
+from importlib import import_module
+import platform
+import threading
+
+try:
+	from time import perf_counter as clock
+except ImportError:
+	from time import time as clock
+
+import_times = {}  # Module: time of its import in seconds, its own dependencies already imported excluded
+
+
+def timed_import(name):
+	"""
+		Imports the module name, recording the time of its import
+	"""
+	start = clock()
+	module = import_module(name)
+	import_times[name] = clock() - start
+	return module
+
+
+mm_http = timed_import('mm_http')
+mm_data = timed_import('mm_data')
+mm_display = timed_import('mm_display')
+import mm_metrics
+
+try:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+except ImportError:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+FIXTURE_DIR = PATH_PREFIX + "bench/fixtures/"
+FRAME_FILENAME = PATH_PREFIX + "bench/last_frame.png"  # Last frame of the benchmark, instead of the one of the panel
+
+NB_RUNS = 10  # Nb of refreshes measured
+TOLERANCE = 20  # Max increase of the median time of a stage over the baseline, in percent
+
+CITY = "La Rochelle"
+COUNTRY = "Fr"
+TODAY = "17"
+
+FIXTURES = [  # Path prefix of the request: fixture file, content type
+	("/data/2.5/weather", "weather.json", "application/json"),
+	("/data/2.5/forecast", "forecast.json", "application/json"),
+	("/maree/", "tide.html", "text/html; charset=utf-8"),
+	("/calendar/v3/calendars/primary/events", "calendar.json", "application/json")
+]
+
+HELP = "python mm_bench.py [-h][-v][-n nb][-o file][-baseline file][-tolerance pc][-tide][-wind]"
+
+verbose = False
+
+
+#-------------------------------------------------
+#--- CLASSES -------------------------------------
+#-------------------------------------------------
+
+class FixtureHandler(BaseHTTPRequestHandler):
+	"""
+		Stand-in for the upstream servers, answering each request with its recorded response
+	"""
+	protocol_version = 'HTTP/1.1'  # Keep-alive, as the upstream servers
+
+	def do_GET(self):
+		for prefix, filename, content_type in FIXTURES:
+			if self.path.startswith(prefix):
+				with open(FIXTURE_DIR + filename, 'rb') as file:
+					body = file.read()
+				self.send_response(200)
+				self.send_header('Content-Type', content_type)
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+				return
+		self.send_error(404)
+
+	def log_message(self, format, *args):
+		if verbose:
+			BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class FixtureServer(ThreadingMixIn, HTTPServer):
+	"""
+		Stand-in server answering each connection in its own thread, so that the connections kept alive by
+		the pooled session of mm_http do not block it (nor its shutdown)
+	"""
+	daemon_threads = True
+
+
+class Timings(object):
+	"""
+		Times of the stages, in seconds, for each refresh
+	"""
+
+	def __init__(self):
+		self.times = {}
+		self.order = []
+
+	def measure(self, stage, function, *args):
+		"""
+			Calls function(*args), adds its duration to the times of stage and returns its result
+		"""
+		start = clock()
+		result = function(*args)
+		self.add(stage, clock() - start)
+		return result
+
+	def add(self, stage, duration):
+		if stage not in self.times:
+			self.times[stage] = []
+			self.order.append(stage)
+		self.times[stage].append(duration)
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def decode_arg(argv):
+	"""
+		Decoding of the shell arguments, returns the options as a dict
+	"""
+	global verbose
+
+	options = {'runs': NB_RUNS, 'output': '', 'baseline': '', 'tolerance': TOLERANCE, 'tide': False, 'wind': False}
+	n = 1
+	length = len(argv)
+	while n < length:
+		arg = argv[n]
+		if arg == '-h':
+			print(HELP)
+			exit(0)
+		elif arg == '-v':
+			verbose = True
+		elif arg == '-tide':
+			options['tide'] = True
+		elif arg == '-wind':
+			options['wind'] = True
+		elif arg in ('-n', '-o', '-baseline', '-tolerance') and n+1 < length:
+			n += 1
+			if arg == '-n':
+				options['runs'] = int(argv[n])
+			elif arg == '-o':
+				options['output'] = argv[n]
+			elif arg == '-baseline':
+				options['baseline'] = argv[n]
+			else:
+				options['tolerance'] = float(argv[n])
+		else:
+			print("Erroneous option: %s\n%s" % (arg, HELP))
+			exit(2)
+		n += 1
+	return options
+
+
+def start_server():
+	"""
+		Starts the stand-in server on a free local port, and points the fetchers of mm_data to it
+	"""
+	server = FixtureServer(('127.0.0.1', 0), FixtureHandler)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+
+	base_url = "http://127.0.0.1:%s" % (server.server_address[1])
+	mm_data.OPENWEATHER_WEA = base_url + "/data/2.5/weather?q=%s&units=metric&appid=%s"
+	mm_data.OPENWEATHER_FOR = base_url + "/data/2.5/forecast?q=%s&units=metric&appid=%s"
+	mm_data.TIDE_URL = base_url + "/maree/%s/"
+	return server, base_url
+
+
+def fetch_events(url):
+	"""
+		Fetches the events of the recorded Google Calendar API response
+	"""
+	response = mm_http.get(url)
+	response.raise_for_status()
+	return response.json().get('items', [])
+
+
+def run_refresh(timings, base_url, tide_display, wind_display):
+	"""
+		Runs a whole refresh on the recorded responses, timing each stage
+	"""
+	location_string = CITY + ',' + COUNTRY
+	start = clock()
+
+	weather_json = timings.measure('fetch_weather', mm_data.download_weather, mm_data.OPENWEATHER_WEA % (location_string, ''))
+	forecast_json = timings.measure('fetch_forecast', mm_data.download_weather, mm_data.OPENWEATHER_FOR % (location_string, ''))
+	events = timings.measure('fetch_calendar', fetch_events, base_url + "/calendar/v3/calendars/primary/events")
+	if tide_display:
+		tide_hours, tide_coef = timings.measure('fetch_tide', mm_data.get_tide, CITY.upper())
+
+	weather_data = timings.measure('parse_weather', mm_data.parse_weather, weather_json, COUNTRY)
+	forecast_data = timings.measure('parse_forecast', mm_data.parse_forecast, forecast_json)
+	event_list = timings.measure('parse_calendar', mm_data.parse_google_events, events)
+	month_cal, day_list = mm_data.get_cal(COUNTRY)
+	monthname = mm_data.get_month(COUNTRY)
+	title = CITY + ', ' + mm_data.get_date(COUNTRY)
+
+	# Each refresh starts from a blank panel, so that the whole screen is rendered
+	mm_metrics.start_run()
+	mm_display.last_frame = None
+	if path.exists(FRAME_FILENAME):
+		remove(FRAME_FILENAME)
+	timings.measure('draw_init', mm_display.draw_init, False, 'memory')
+
+	timings.measure('init_display', mm_display.init_display, wind_display)
+	if tide_display:
+		timings.measure('display_tide', mm_display.display_tide, tide_hours, tide_coef, COUNTRY)
+	else:
+		timings.measure('display_ephem', mm_display.display_ephem, weather_data, COUNTRY)
+	timings.measure('display_weather', mm_display.display_weather, weather_data, wind_display)
+	timings.measure('display_forecast', mm_display.display_forecast, forecast_data, wind_display)
+	timings.measure('display_calendar', mm_display.display_calendar, month_cal, day_list, monthname, TODAY, event_list, wind_display)
+	timings.measure('display_title', mm_display.display_title, title)
+	timings.measure('display_show', mm_display.display_show)
+	for record in mm_metrics.records:  # Drawing of each widget, timed by mm_display.render_scene within display_show
+		if record['name'].startswith('render_'):
+			timings.add(record['name'], record['time'] / 1000.0)
+
+	timings.add('refresh', clock() - start)
+	return
+
+
+def statistics(times):
+	"""
+		Returns the min, median, mean and max of times, in milliseconds
+	"""
+	times = sorted(times)
+	middle = len(times) // 2
+	if len(times) % 2:
+		median = times[middle]
+	else:
+		median = (times[middle - 1] + times[middle]) / 2.0
+	return {
+		'min': round(times[0] * 1000, 3),
+		'median': round(median * 1000, 3),
+		'mean': round(sum(times) * 1000 / len(times), 3),
+		'max': round(times[-1] * 1000, 3)
+	}
+
+
+def run_bench(runs, tide_display=False, wind_display=False):
+	"""
+		Runs the benchmark and returns its results (see module doc)
+	"""
+	mm_data.verbose = verbose
+	mm_display.verbose = verbose
+	mm_display.LAST_FRAME_FILENAME = FRAME_FILENAME
+
+	start = clock()
+	try:
+		mm_data.import_google()
+		import_times['google'] = clock() - start
+	except ImportError as e:
+		print("Google stack not installed: %s" % (e))
+	server, base_url = start_server()
+
+	timings = Timings()
+	try:
+		for i in range(runs):
+			run_refresh(timings, base_url, tide_display, wind_display)
+	finally:
+		server.shutdown()
+		server.server_close()
+
+	stages = {}
+	for stage in timings.order:
+		stages[stage] = statistics(timings.times[stage])
+	return {
+		'version': version_prog,
+		'python': platform.python_version(),
+		'machine': platform.machine(),
+		'runs': runs,
+		'tide_display': tide_display,
+		'wind_display': wind_display,
+		'order': timings.order,
+		'stages': stages,
+		'imports': dict((name, round(import_times[name] * 1000, 3)) for name in import_times)
+	}
+
+
+def compare(results, baseline, tolerance):
+	"""
+		Returns the list of the stages whose median time exceeds the one of baseline by more than tolerance percent
+	"""
+	regressions = []
+	for stage in results['stages']:
+		if stage in baseline.get('stages', {}):
+			before = baseline['stages'][stage]['median']
+			after = results['stages'][stage]['median']
+			if after > before * (1 + tolerance / 100.0):
+				regressions.append({'stage': stage, 'baseline': before, 'median': after})
+	return regressions
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	options = decode_arg(argv)
+
+	results = run_bench(options['runs'], options['tide'], options['wind'])
+
+	regressions = []
+	if options['baseline'] != '':
+		with open(options['baseline'], 'r') as file:
+			regressions = compare(results, load(file), options['tolerance'])
+		results['regressions'] = regressions
+
+	if options['output'] != '':
+		with open(options['output'], 'w') as file:
+			dump(results, file, indent=1, sort_keys=True)
+	else:
+		print(dumps(results, indent=1, sort_keys=True))
+
+	for regression in regressions:
+		print("Regression of %s: %.1f ms (baseline %.1f ms)" % (regression['stage'], regression['median'], regression['baseline']))
+	exit(1 if regressions else 0)
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
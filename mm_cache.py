@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_cache.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_cache.py"
+
+"""
+Version: 17/10/26
+
+On-disk cache of the JSON responses fetched by the magic mirror, with a time to live per entry
+and stale-while-revalidate:
+- an entry younger than its ttl is served without any network access
+- an older entry is served immediately, while a background thread fetches a fresh one for the next run
+- an entry older than MAX_STALE is fetched again before being served, but is still served if the fetch fails,
+so that the screen has something to show when the network is down
+- when the server is known to be unavailable (eg its circuit is open in mm_http), any entry is served, whatever its age,
+without attempting to fetch it
+- when the caller asks to revalidate (eg a refresh fired by the scheduler because the data is due), an entry older than
+its ttl is fetched again before being served, instead of being refreshed in the background
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Entries served without fetching when the server is unavailable
+- Logging through the buffered logger of mm_log
+- Stale entries fetched before being served when the caller asks to revalidate
+
+
+USAGE:
+-----
+From another python program:
+get(key, ttl, fetch, is_valid, available=True, revalidate=False): returns the data cached for key (usually the URL),
+	where fetch(key) is called to get fresh data when the entry is missing or older than ttl seconds,
+	is_valid(data) tells if the fetched data shall be stored in the cache,
+	available is False when the server is known to be down,
+	and revalidate is True when a stale entry shall be fetched again before being served
+
+
+SIDE EFFECTS:
+------------
+Stores the cached entries as JSON files in CACHE_DIR
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from json import dump, load
+from hashlib import sha1
+from time import time
+from os import path, makedirs, rename
+import threading
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+CACHE_DIR = PATH_PREFIX + "cache/"
+
+MAX_STALE = 86400  # Age in seconds after which an entry is fetched again before being served
+
+verbose = False
+
+refreshing = set()  # Keys currently refreshed in background
+refreshing_lock = threading.Lock()
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
+	"""
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
+	"""
+	mm_log.log(txt, verbose or forceprint, level, args)
+	return
+
+
+def entry_filename(key):
+	"""
+		Returns the name of the file storing the entry for key
+	"""
+	return CACHE_DIR + sha1(key.encode('utf-8')).hexdigest() + '.json'
+
+
+def read_entry(key):
+	"""
+		Returns the entry {'time': ..., 'data': ...} stored for key, or None
+	"""
+	try:
+		with open(entry_filename(key), 'r') as file:
+			return load(file)
+	except Exception:
+		return None
+
+
+def write_entry(key, data):
+	"""
+		Stores data for key, with the current time
+	"""
+	try:
+		if not path.isdir(CACHE_DIR):
+			makedirs(CACHE_DIR)
+		filename = entry_filename(key)
+		with open(filename + '.tmp', 'w') as file:
+			dump({'time': time(), 'data': data}, file)
+		rename(filename + '.tmp', filename)
+	except Exception as e:
+		tolog("...error writing cache entry: %s", True, mm_log.ERROR, (e,))
+	return
+
+
+def refresh(key, fetch, is_valid):
+	"""
+		Fetches fresh data for key and stores it if valid, returns the data
+	"""
+	data = fetch(key)
+	if is_valid(data):
+		write_entry(key, data)
+	return data
+
+
+def refresh_background(key, fetch, is_valid):
+	"""
+		Starts a thread refreshing the entry for key, unless one is already running
+		The thread is not a daemon one, so that the refresh is completed before the program exits
+	"""
+	def run():
+		try:
+			refresh(key, fetch, is_valid)
+		finally:
+			with refreshing_lock:
+				refreshing.discard(key)
+
+	with refreshing_lock:
+		if key in refreshing:
+			return
+		refreshing.add(key)
+	threading.Thread(target=run).start()
+	return
+
+
+def get(key, ttl, fetch, is_valid, available=True, revalidate=False):
+	"""
+		Returns the data for key, from the cache if possible (see module doc)
+	"""
+	entry = read_entry(key)
+	if entry is not None and not available:
+		tolog("...server unavailable, serving cache entry (%d s)", True, mm_log.WARNING, (time() - entry['time'],))
+		return entry['data']
+	if entry is None:
+		tolog("...no cache entry, fetching")
+		return refresh(key, fetch, is_valid)
+
+	age = time() - entry['time']
+	if age < ttl:
+		tolog("...cache entry fresh (%d s)", args=(age,))
+		return entry['data']
+
+	if age < MAX_STALE and not revalidate:
+		tolog("...cache entry stale (%d s), refreshing in background", args=(age,))
+		refresh_background(key, fetch, is_valid)
+		return entry['data']
+
+	tolog("...cache entry %s (%d s), fetching", args=('stale' if age < MAX_STALE else 'too old', age))
+	data = refresh(key, fetch, is_valid)
+	if is_valid(data):
+		return data
+	tolog("...fetching failed, serving cache entry", True, mm_log.WARNING)
+	return entry['data']
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_calendar.py						#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_calendar.py"
+
+"""
+Version: 17/10/26
+
+Incremental synchronisation of the Google calendar of the magic mirror with a local event store
+
+The events of the calendar are kept in a local store (STORE_FILENAME), with the syncToken returned by the Google
+Calendar API: each refresh only fetches the events created, modified or deleted since the previous one, which is
+usually an empty page, and the upcoming events are then served from the store. If the calendar cannot be reached,
+the events of the store are still served, so that the event panel keeps working offline.
+
+The first synchronisation (or a new one, when Google invalidates the syncToken) fetches all the events of the calendar.
+The events which ended more than PRUNE_DELAY seconds ago are dropped from the store.
+
+The service of the Google Calendar API is built from the discovery document stored in DISCOVERY_FILENAME
+(downloaded again when older than DISCOVERY_TTL), instead of fetching and parsing it for each call, and it is kept
+in memory to be reused by the next refreshes (daemon mode) as long as the credentials are the same.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Calendar service built from the discovery document stored on disk, and reused between refreshes
+
+
+USAGE:
+-----
+From another python program:
+get_service(creds): returns the service of the Google Calendar API for the credentials creds
+sync(service): fetches the changes of the calendar with the Google Calendar API service, and applies them to the store
+upcoming(nb): returns the nb next events of the store (not ended yet), sorted by start, as items of the Google Calendar API
+
+
+SIDE EFFECTS:
+------------
+Stores the events of the calendar and the syncToken in STORE_FILENAME, and the discovery document in DISCOVERY_FILENAME
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from calendar import timegm
+from datetime import datetime
+from json import dump, load
+from time import mktime, strptime, time
+from os import path, rename
+import threading
+import mm_http
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+STORE_FILENAME = PATH_PREFIX + "calendar_store.json"
+DISCOVERY_FILENAME = PATH_PREFIX + "calendar_discovery.json"
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/calendar/v3/rest"
+DISCOVERY_TTL = 30 * 86400  # Age of the discovery document after which it is downloaded again, in seconds
+
+CALENDAR_ID = 'primary'
+PAGE_SIZE = 250  # Nb of events per page of the Google Calendar API
+PRUNE_DELAY = 86400  # Delay after their end after which the events are dropped from the store, in seconds
+EVENT_FIELDS = ['id', 'summary', 'start', 'end']  # Fields of the events kept in the store
+
+verbose = False
+
+store = None  # {'syncToken': ..., 'events': {id: event}}, loaded from STORE_FILENAME on first use
+store_lock = threading.Lock()
+
+service = None  # Service of the Google Calendar API, kept between refreshes
+service_creds = None  # Credentials of service
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
+	"""
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
+	"""
+	mm_log.log(txt, verbose or forceprint, level, args)
+	return
+
+
+def event_time(moment):
+	"""
+		Returns the time of moment, the 'start' or 'end' of an event ({'date': ...} or {'dateTime': ...})
+	"""
+	if 'dateTime' not in moment:
+		return mktime(strptime(moment['date'], '%Y-%m-%d'))  # All-day event, in local time
+
+	text = moment['dateTime']
+	utc = timegm(datetime.strptime(text[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+	zone = text[19:].lstrip('.0123456789')  # Fraction of second ignored
+	if zone in ('', 'Z'):
+		return utc
+	sign = -1 if zone[0] == '-' else 1
+	hours, minutes = zone[1:].split(':')
+	return utc - sign * (int(hours) * 3600 + int(minutes) * 60)
+
+
+#-------------------------------------------------
+#		Service functions
+#-------------------------------------------------
+
+def discovery_document():
+	"""
+		Returns the discovery document of the Calendar API, from DISCOVERY_FILENAME if it is younger than DISCOVERY_TTL
+	"""
+	if path.exists(DISCOVERY_FILENAME) and time() - path.getmtime(DISCOVERY_FILENAME) < DISCOVERY_TTL:
+		with open(DISCOVERY_FILENAME, 'r') as file:
+			return file.read()
+
+	tolog("Downloading calendar discovery document...")
+	try:
+		response = mm_http.get(DISCOVERY_URL)
+		response.raise_for_status()
+		document = response.text
+		with open(DISCOVERY_FILENAME + '.tmp', 'w') as file:
+			file.write(document)
+		rename(DISCOVERY_FILENAME + '.tmp', DISCOVERY_FILENAME)
+		return document
+	except Exception as e:
+		if not path.exists(DISCOVERY_FILENAME):
+			raise
+		tolog("...error downloading discovery document, using the stored one: %s", True, mm_log.WARNING, (e,))
+		with open(DISCOVERY_FILENAME, 'r') as file:
+			return file.read()
+
+
+def get_service(creds):
+	"""
+		Returns the service of the Calendar API for creds, built on first call or when the credentials change
+	"""
+	global service, service_creds
+
+	if service is None or service_creds is not creds:
+		from googleapiclient.discovery import build_from_document
+
+		service = build_from_document(discovery_document(), credentials=creds)
+		service_creds = creds
+	return service
+
+
+#-------------------------------------------------
+#		Store functions
+#-------------------------------------------------
+
+def get_store():
+	"""
+		Returns the store, loaded from STORE_FILENAME on first call (to be called with store_lock acquired)
+	"""
+	global store
+
+	if store is None:
+		try:
+			with open(STORE_FILENAME, 'r') as file:
+				store = load(file)
+		except Exception:
+			store = {'syncToken': None, 'events': {}}
+	return store
+
+
+def save_store():
+	"""
+		Saves the store (to be called with store_lock acquired)
+	"""
+	try:
+		with open(STORE_FILENAME + '.tmp', 'w') as file:
+			dump(store, file)
+		rename(STORE_FILENAME + '.tmp', STORE_FILENAME)
+	except Exception as e:
+		tolog("...error saving calendar store: %s", True, mm_log.ERROR, (e,))
+	return
+
+
+def apply_event(event):
+	"""
+		Applies to the store an event returned by the API (added, modified or cancelled)
+	"""
+	if event.get('status') == 'cancelled':
+		store['events'].pop(event['id'], None)
+	elif 'start' in event and 'end' in event:
+		store['events'][event['id']] = dict((field, event[field]) for field in EVENT_FIELDS if field in event)
+	return
+
+
+def prune(now):
+	"""
+		Drops from the store the events ended more than PRUNE_DELAY seconds ago
+	"""
+	events = store['events']
+	for event_id in list(events):
+		if event_time(events[event_id]['end']) < now - PRUNE_DELAY:
+			del events[event_id]
+	return
+
+
+#-------------------------------------------------
+#		Synchronisation functions
+#-------------------------------------------------
+
+def list_changes(service, sync_token):
+	"""
+		Returns the events changed since sync_token (all the events if None) and the next syncToken
+	"""
+	args = {'calendarId': CALENDAR_ID, 'singleEvents': True, 'maxResults': PAGE_SIZE}
+	if sync_token:
+		args['syncToken'] = sync_token
+	events = []
+	while True:
+		result = service.events().list(**args).execute()
+		events += result.get('items', [])
+		if 'nextPageToken' not in result:
+			return events, result.get('nextSyncToken')
+		args['pageToken'] = result['nextPageToken']
+
+
+def sync(service):
+	"""
+		Applies to the store the changes of the calendar since the last synchronisation
+		Raises the errors of the API, the store being left as it was
+	"""
+	with store_lock:
+		get_store()
+		sync_token = store['syncToken']
+		try:
+			events, next_token = list_changes(service, sync_token)
+		except Exception as e:
+			if sync_token is None or getattr(getattr(e, 'resp', None), 'status', None) != 410:
+				raise
+			tolog("...calendar sync token expired, full synchronisation")
+			sync_token = None
+			events, next_token = list_changes(service, None)
+
+		if sync_token is None:
+			store['events'] = {}
+		for event in events:
+			apply_event(event)
+		store['syncToken'] = next_token
+		prune(time())
+		save_store()
+	tolog("...calendar synchronised (%s changes, %s events stored)", args=(len(events), len(store['events'])))
+	return
+
+
+def upcoming(nb):
+	"""
+		Returns the nb next events of the store, not ended yet, sorted by start
+	"""
+	now = time()
+	with store_lock:
+		events = [event for event in get_store()['events'].values() if event_time(event['end']) > now]
+	events.sort(key=lambda event: event_time(event['start']))
+	return events[:nb]
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_credentials.py					#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_credentials.py"
+
+"""
+Version: 17/10/26
+
+Manager of the OAuth credentials of the Google calendar of the magic mirror
+
+The credentials are read once from TOKEN_FILENAME and then kept in memory. They are refreshed in a background thread
+REFRESH_MARGIN seconds before they expire (scheduled in daemon mode, or started as soon as a run finds them close to
+expiry), so that the refresh of the token is not on the critical path of the render; they are refreshed synchronously
+only when they have already expired. After a failed background refresh (eg offline), the next one is delayed with the
+exponential backoff of mm_http (as the retries of mm_data). The token file is written atomically (written aside, then renamed).
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Backoff between the background refreshes which failed
+- Background refresh under creds_lock, skipped if the credentials have been refreshed meanwhile
+
+
+USAGE:
+-----
+From another python program:
+get_credentials(): returns the valid credentials, loaded, refreshed or obtained through the authorization flow if needed
+
+
+PREREQUISITS:
+------------
+Requires in current directory the file:
+- credentials.json : client secrets of the application, for the first authorization flow
+
+Installation of the libs:
+	pip install --upgrade google-api-python-client google-auth-httplib2 google-auth-oauthlib
+
+
+SIDE EFFECTS:
+------------
+Stores the user's access and refresh tokens in TOKEN_FILENAME
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from datetime import datetime
+from os import path, rename
+import pickle
+import threading
+import mm_http
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+TOKEN_FILENAME = PATH_PREFIX + 'token.pickle'
+CLIENT_SECRETS_FILENAME = PATH_PREFIX + 'credentials.json'
+
+# If modifying these scopes, delete the file token.pickle.
+SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+
+REFRESH_MARGIN = 300  # Delay before the expiry of the credentials at which they are refreshed, in seconds
+
+verbose = False
+
+creds = None  # Credentials, kept in memory once loaded
+creds_lock = threading.RLock()
+refresher = None  # Background refresh, running or scheduled
+failures = 0  # Nb of consecutive failed background refreshes
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
+	"""
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
+	"""
+	mm_log.log(txt, verbose or forceprint, level, args)
+	return
+
+
+def save_token():
+	"""
+		Saves the credentials in TOKEN_FILENAME, atomically
+	"""
+	with open(TOKEN_FILENAME + '.tmp', 'wb') as token:
+		pickle.dump(creds, token)
+	rename(TOKEN_FILENAME + '.tmp', TOKEN_FILENAME)
+	return
+
+
+def time_to_expiry():
+	"""
+		Returns the nb of seconds before the credentials expire, or None if their expiry is unknown
+	"""
+	if creds is None or creds.expiry is None:
+		return None
+	return (creds.expiry - datetime.utcnow()).total_seconds()
+
+
+#-------------------------------------------------
+#		Refresh functions
+#-------------------------------------------------
+
+def refresh():
+	"""
+		Refreshes the credentials in place (so that the services built with them stay valid) and saves them
+	"""
+	from google.auth.transport.requests import Request
+
+	creds.refresh(Request())
+	save_token()
+	tolog("...Google credentials refreshed")
+	return
+
+
+def refresh_background():
+	"""
+		Refreshes the credentials in the background thread, then schedules the next refresh
+		The refresh holds creds_lock, and is skipped if the credentials have been refreshed meanwhile (eg by
+		get_credentials), so that they are never refreshed nor saved by two threads at once
+	"""
+	global refresher, failures
+
+	with creds_lock:
+		delay = time_to_expiry()
+		if creds.valid and delay is not None and delay > REFRESH_MARGIN:
+			tolog("...Google credentials already refreshed")
+		else:
+			try:
+				refresh()
+				failures = 0
+			except Exception as e:
+				failures += 1
+				tolog("...error refreshing Google credentials (%s failures): %s", True, mm_log.ERROR, (failures, e))
+		refresher = None
+		schedule_refresh()
+	return
+
+
+def schedule_refresh():
+	"""
+		Schedules a background refresh REFRESH_MARGIN seconds before the credentials expire, unless one is pending,
+		or after a backoff delay if the last ones failed
+		The timer thread is a daemon one, so that it does not keep the program running
+	"""
+	global refresher
+
+	with creds_lock:
+		delay = time_to_expiry()
+		if refresher is not None or delay is None or not creds.refresh_token:
+			return
+		delay = max(0, delay - REFRESH_MARGIN)
+		if failures:
+			delay = max(delay, mm_http.backoff(failures - 1))
+		refresher = threading.Timer(delay, refresh_background)
+		refresher.daemon = True
+		refresher.start()
+	return
+
+
+#-------------------------------------------------
+#		Credential functions
+#-------------------------------------------------
+
+def get_credentials():
+	"""
+		Returns the valid credentials (see module doc)
+	"""
+	global creds
+
+	if creds is not None and creds.valid:
+		schedule_refresh()
+		return creds
+
+	with creds_lock:
+		# The file token.pickle stores the user's access and refresh tokens, and is
+		# created automatically when the authorization flow completes for the first
+		# time.
+		if creds is None and path.exists(TOKEN_FILENAME):
+			with open(TOKEN_FILENAME, 'rb') as token:
+				creds = pickle.load(token)
+		# If there are no (valid) credentials available, let the user log in.
+		if not creds or not creds.valid:
+			if creds and creds.expired and creds.refresh_token:
+				tolog("Google credentials expired, refreshing...")
+				refresh()
+			else:
+				from google_auth_oauthlib.flow import InstalledAppFlow
+
+				flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILENAME, SCOPES)
+				creds = flow.run_local_server(port=0)
+				save_token()
+		schedule_refresh()
+		return creds
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
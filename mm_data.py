@@ -18,6 +18,21 @@ Python program for fetching weather info on openweather web server and tide info
 
 HISTORY:
 --------
+17/10/26:
+- All fetchers use the shared HTTP session of mm_http (keep-alive, connection pool, timeouts)
+- OpenWeather responses cached on disk by mm_cache (WEATHER_TTL, FORECAST_TTL)
+- retrieve_* functions retry with exponential backoff and jitter, within a time budget per refresh (REFRESH_BUDGET)
+- Retries stop as soon as the circuit of the server is open (see mm_http)
+- Parsing of the responses split from the fetching (parse_weather, parse_forecast, parse_google_events), to be benchmarked on its own
+- Fetchers, parsers and retrieve_* functions measured by spans of mm_metrics (wall time, retries, bytes received)
+- Logging through the buffered logger of mm_log
+- Google API client and OAuth stack imported on first call of fetch_google_events only (import_google)
+- Calendar synchronised incrementally (syncToken) with the local event store of mm_calendar, from which the next events are served
+- Calendar service built by mm_calendar from the discovery document stored on disk, and reused between calls
+- Expired cache entries fetched before being served during the refreshes fired by the scheduler (start_refresh), TTLs shorter than the refresh intervals
+- Google credentials managed by mm_credentials: kept in memory, refreshed in background before expiry, token file written atomically
+- Tides predicted locally by mm_tide from the harmonic constants of the port when known, horaire-maree scraped otherwise
+
 19/7/20:
 - Added config file
 - Cleanup of the code
@@ -57,6 +72,8 @@ get_forecast(city, country, openweather_ID): returns forecast for city, country,
 	'condition_code': weather condition code of the day at noon,
 	'condition_name': weather condition name of the day at noon
 }
+parse_weather(weather_json, country), parse_forecast(forecast_json): same as above, from the JSON response of openweather
+parse_google_events(events): returns the list of events to display, from the 'items' of a Google Calendar API response
 get_tide(city): returns tide_hours, tide_coef info for the city, where tide_hours is an array of 1 or 2 hightide hours for the day, and tide_coef is the tide coef
 
 
@@ -65,6 +82,12 @@ PREREQUISITS:
 Requires the following file:
 - config_magicmirror.conf : configuration data
 - token.pickle : to store the user's access and refresh tokens (regenerated)
+- mm_http : shared HTTP session used by the fetchers
+- mm_cache : disk cache of the openweather responses
+- mm_credentials : Google credentials, refreshed before they expire
+- mm_tide : local tide prediction from the harmonic constants of the ports
+- mm_calendar : local store of the events of the Google calendar, synchronised incrementally
+- mm_metrics : timing of the fetchers
 
 
 Installation of the libs:
@@ -74,13 +97,13 @@ Installation of the libs:
 
 SIDE EFFECTS:
 ------------
-Logs to LOG_FILENAME resultq (or errorq) of the program and displays it if verbose mode
+Logs to mm_log.LOG_FILENAME resultq (or errorq) of the program and displays it if verbose mode
 
 
 KNOWN BUGS:
 ----------
 - Sometimes get_location returns '' as location, and hence the forecast displayed is for city_default
-- TIDE_URL works only for some cities on the French West coast and returns no data if the city is not recognised (and sometimes the name should be CAPITALIZED) -- hence the option to force a city name with -tidename (list of cities here: http://www.horaire-maree.fr/)
+- TIDE_URL (used for the ports without harmonic constants in resources/tide_ports.json) works only for some cities on the French West coast and returns no data if the city is not recognised (and sometimes the name should be CAPITALIZED) -- hence the option to force a city name with -tidename (list of cities here: http://www.horaire-maree.fr/)
 - OPENWEATHER server works only for some cities and returns no data if the city is not recognised -- hence the option to force a city name with -weathername (list of cities is here: http://bulk.openweathermap.org/sample/city.list.json.gz)
 
 """
@@ -92,15 +115,21 @@ KNOWN BUGS:
 
 from json import loads
 from re import match
-from time import strftime, sleep, timezone
+from time import strftime, sleep, timezone, time
 from sys import exit, argv
 import socket
 from datetime import datetime
 from calendar import Calendar
-from requests import get
-import urllib2 
 from os import path, system
 from configparser import ConfigParser
+import mm_http
+import mm_cache
+import mm_calendar
+import mm_credentials
+import mm_tide
+import mm_log
+from mm_log import remove_non_ascii
+import mm_metrics
 
 try:
 	from psutil import cpu_percent
@@ -108,28 +137,30 @@ try:
 except:
 	has_psutil = False
 
-import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+google_imported = False  # The Google API client and OAuth stack are imported by import_google, only when the calendar is fetched
 
 #-------------------------------------------------
 #--- DEFINITIONS ---------------------------------
 #-------------------------------------------------
 
 PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
-LOG_FILENAME = PATH_PREFIX + "log_magicmirror.log"
 CONFIG_FILENAME = PATH_PREFIX + 'config_magicmirror.conf'
 
 NB_FORECAST = 6
+NB_EVENTS = 10  # Nb of next events of the calendar returned by fetch_google_events
 
 MAX_ITER = 20  # Max nb of iteration of info fetching attempts
-DELAY =  1200 # Delai between two retries in seconds
+REFRESH_BUDGET = 300  # Max total time spent retrying during one refresh, in seconds
 
 OPENWEATHER_FOR = "http://api.openweathermap.org/data/2.5/forecast?q=%s&units=metric&appid=%s"
 OPENWEATHER_WEA = "http://api.openweathermap.org/data/2.5/weather?q=%s&units=metric&appid=%s"
+# The TTLs are shorter than the refresh intervals of magicmirror (REFRESH_POLICIES), so that a scheduled refresh
+# always finds the entry expired, and fetches it (see start_refresh)
+WEATHER_TTL = 600  # Time to live of the cached current weather, in seconds
+FORECAST_TTL = 2 * 3600  # Time to live of the cached forecast, in seconds
 TIDE_URL = "http://www.horaire-maree.fr/maree/%s/"
 LOCATION_INFO = "http://ipinfo.io"
+PUBLIC_IP_INFO = "http://ip.42.pl/raw"
 # ISS = "http://api.open-notify.org/iss-now.json"
 CPU_TEMP_FILE = '/sys/class/thermal/thermal_zone0/temp'
 
@@ -231,8 +262,6 @@ WEEKDAYFULL_FR = [
 
 verbose = True
 
-# If modifying these scopes, delete the file token.pickle.
-SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 
 
 #-------------------------------------------------
@@ -245,17 +274,11 @@ SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 #-------------------------------------------------
 
 
-def tolog(txt, forceprint=False):
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
 	"""
-		Logs events and prints it if forceprint = True
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
 	"""
-	txt = remove_non_ascii(txt)
-	if verbose or forceprint:
-		print(txt)
-	now = strftime('%Y/%m/%d %H:%M:%S')
-	msg = "%s\t%s" % (now, txt)
-	with open(LOG_FILENAME, 'a') as file:
-		file.write(msg + "\n")
+	mm_log.log(txt, verbose or forceprint, level, args)
 	return
 
 
@@ -288,42 +311,42 @@ def decode_arg(argv):
 		elif arg == '-tidename':	# Set tide name
 			tide_display = True
 			if n == length:
-				tolog("...error: param -tidename should be followed by a name", True)
+				tolog("...error: param -tidename should be followed by a name", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("...error: param -tidename should be followed by a name", True)
+				tolog("...error: param -tidename should be followed by a name", True, mm_log.ERROR)
 			else:
 				tide_city = argv[n+1]
 				if city == '':
 					city = tide_city
 				n += 1
-				tolog("Set name for tide as %s" % (tide_city))
+				tolog("Set name for tide as %s", args=(tide_city,))
 		elif arg == '-weathername':  # Set weather name
 			if n == length:
-				tolog("...error: param -weathername should be followed by a name", True)
+				tolog("...error: param -weathername should be followed by a name", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("...error: param -weathername should be followed by a name", True)
+				tolog("...error: param -weathername should be followed by a name", True, mm_log.ERROR)
 			else:
 				weather_city = argv[n+1]
 				n += 1
 				if city == '':
 					city = weather_city
-				tolog("Set name for weather as %s" % (weather_city))
+				tolog("Set name for weather as %s", args=(weather_city,))
 		elif arg == '-city':  # Set city name
 			if n == length:
-				tolog("...error: param -city should be followed by a name", True)
+				tolog("...error: param -city should be followed by a name", True, mm_log.ERROR)
 			elif argv[n+1][0] == '-':
-				tolog("...error: param -city should be followed by a name", True)
+				tolog("...error: param -city should be followed by a name", True, mm_log.ERROR)
 			else:
 				n += 1
 				city = argv[n]
-				tolog("Set city name as %s" % (city))
+				tolog("Set city name as %s", args=(city,))
 				if n+1 < length:
 					if not argv[n+1][0] == '-':
 						n += 1
 						country = argv[n]
-						tolog("Set country name as %s" % (country))
+						tolog("Set country name as %s", args=(country,))
 		elif arg[0] == '-':
-			tolog("Errorenous option: %s" % (arg), True)
+			tolog("Errorenous option: %s", True, mm_log.ERROR, (arg,))
 		n += 1
 	return city, country, tide_city, weather_city
 
@@ -374,14 +397,6 @@ def extract_text(line, st1, st2, pos0):
 	return (text, pos2)
 
 
-def remove_non_ascii(text):
-	"""
-		Returns text where non-ascii chars have been removed
-	"""
-	if type(text) is unicode:
-		text = ''.join(i for i in text if ord(i) < 128)
-	return text
-
 #-------------------------
 # 		Function to retrieve configuration
 #-------------------------
@@ -417,21 +432,93 @@ def load_config():
 		# FLAGS parameters
 
 		tide_display = config.getboolean('FLAGS', 'tideDisplay')
+
+		# HTTP parameters
+
+		mm_http.load_config(config)
 		tolog("...loading of the config file ok")
 
 	except Exception as e:
-		tolog('...error reading config file %s, SORRY: %s' %
-		      (CONFIG_FILENAME, e), True)
+		tolog('...error reading config file %s, SORRY: %s', True, mm_log.ERROR,
+		      (CONFIG_FILENAME, e))
 		exit()
 	return
 
 
+#-------------------------------------------------
+#		Retry functions
+#-------------------------------------------------
+
+class Deadline(object):
+	"""
+		Time budget shared by all the fetching attempts of a refresh
+	"""
+
+	def __init__(self, budget):
+		self.end = time() + budget
+
+	def remaining(self):
+		return max(0, self.end - time())
+
+
+refresh_deadline = None  # Deadline of the current refresh (see start_refresh)
+refresh_revalidate = False  # True if the cache entries older than their TTL are fetched before being served
+
+
+def start_refresh(budget=None, revalidate=False):
+	"""
+		Starts a new refresh: all retrieve_* functions called until the next refresh share a time budget of budget seconds
+		If revalidate (refresh fired by a scheduler because the data is due), the expired cache entries are fetched
+		before being served, instead of being served while refreshed in the background
+	"""
+	global refresh_deadline, refresh_revalidate
+
+	refresh_revalidate = revalidate
+	if budget is None:
+		budget = REFRESH_BUDGET
+	refresh_deadline = Deadline(budget)
+	return refresh_deadline
+
+
+def retry(fetch, is_ok, deadline=None, url=None):
+	"""
+		Calls fetch() until is_ok(result), at most MAX_ITER times, and returns the last result
+		Waits between attempts with the exponential backoff and full jitter of mm_http.backoff,
+		and gives up as soon as the next wait would exceed the deadline (by default, the one of the current refresh),
+		or as soon as the circuit of the server of url is open
+	"""
+	if deadline is None:
+		deadline = refresh_deadline
+	if deadline is None:
+		deadline = start_refresh()
+
+	for i in range(MAX_ITER):
+		result = fetch()
+		if is_ok(result):
+			break
+		if url is not None and mm_http.is_open(url):
+			tolog("...server unavailable, giving up", True, mm_log.WARNING)
+			break
+		if i == MAX_ITER - 1:
+			tolog("...no valid result after %s attempts, giving up", True, mm_log.WARNING, (MAX_ITER,))
+			break
+		delay = mm_http.backoff(i)
+		if delay >= deadline.remaining():
+			tolog("...time budget of the refresh exhausted, giving up", True, mm_log.WARNING)
+			break
+		tolog("...retrying in %.0f s", args=(delay,))
+		mm_metrics.add_retry()
+		sleep(delay)
+	return result
+
+
 #-------------------------------------------------
 #		Location function
 #-------------------------------------------------
 
 #---- Fetch location
 
+@mm_metrics.timed('get_location')
 def get_location():
 	"""
 		Fetches location information and returns city, country
@@ -441,28 +528,24 @@ def get_location():
 
 	tolog("Fetching location info...")
 	try:
-		res = get(LOCATION_INFO)
+		res = mm_http.get(LOCATION_INFO)
 		result = res.status_code
 		if (result == 200):
 			json_data = loads(res.text)
 			city = json_data["city"]
 			country = json_data["country"]
-			tolog("...found city = %s, country = %s" %(city, country))
+			tolog("...found city = %s, country = %s", args=(city, country))
 		else:
-			tolog("...error fetching location info: status %s" % (result), True)
+			tolog("...error fetching location info: status %s", True, mm_log.ERROR, (result,))
 	except Exception as e:
-		tolog("...error fetching location info: %s" % (e), True)
+		tolog("...error fetching location info: %s", True, mm_log.ERROR, (e,))
 
 	return city, country
 
 
-def retrieve_location():
-	for i in range(MAX_ITER):
-		city, country = get_location()
-		if city != '':
-			break
-		sleep(DELAY)
-	return city, country
+@mm_metrics.timed('retrieve_location')
+def retrieve_location(deadline=None):
+	return retry(get_location, lambda result: result[0] != '', deadline, LOCATION_INFO)
 
 
 #-------------------------------------------------
@@ -471,78 +554,106 @@ def retrieve_location():
 
 #---- Fetch weather info
 
-def fetch_weather(url):
+@mm_metrics.timed('download_weather')
+def download_weather(url):
 	"""
-		Fetches weather info on openweather site and returns JSON response
+		Downloads weather info on openweather site and returns JSON response
 	"""
-	tolog("Fetching weather info with url %s..." %(url))
+	tolog("Downloading weather info with url %s...", args=(url,))
 	try:
-		response = get(url).text
+		response = mm_http.get(url).text
 		weather_json = loads(response)
 		tolog("...fetching OK")
 		return weather_json
 	except Exception as e:
-		tolog("...error fetching weather info: %s" %(e), True)
+		tolog("...error fetching weather info: %s", True, mm_log.ERROR, (e,))
 		return {}
 
 
+def weather_ok(weather_json):
+	"""
+		Tests if the JSON response of openweather is a valid one (and not an error message)
+	"""
+	return weather_json != {} and str(weather_json.get('cod')) == '200'
+
+
+def fetch_weather(url, ttl=0):
+	"""
+		Fetches weather info on openweather site and returns JSON response,
+		served from the disk cache if it is younger than ttl seconds
+	"""
+	if ttl == 0:
+		return download_weather(url)
+	tolog("Fetching weather info from cache...")
+	return mm_cache.get(url, ttl, download_weather, weather_ok, not mm_http.is_open(url), refresh_revalidate)
+
+
+@mm_metrics.timed('get_weather')
 def get_weather(city, country, openweather_ID):
 	"""
 		Fetches current weather info and returns UTC and time of the weather, temperature, name and code of the weather condition
 	"""
 
-	weather_data = {}
-
 	location_string = city + ',' + country
 
+	tolog("Fetching current weather...")
+
+	weather_current = fetch_weather(OPENWEATHER_WEA %(location_string, openweather_ID), WEATHER_TTL)
+	return parse_weather(weather_current, country)
+
+
+@mm_metrics.timed('parse_weather')
+def parse_weather(weather_current, country):
+	"""
+		Extracts the current weather info from the JSON response of openweather (see get_weather)
+	"""
+	weather_data = {}
+
 	tzone = -3600 + timezone
-	tolog("Delta Timezone = %s" %(tzone))
+	tolog("Delta Timezone = %s", args=(tzone,))
 
  	#----- Extract current weather data
 
-	tolog("Fetching current weather...")
-
-	weather_current = fetch_weather(OPENWEATHER_WEA %(location_string, openweather_ID))
 	if weather_current == {}:
-		tolog("...error reading weather info: cannot read current weather", True)
+		tolog("...error reading weather info: cannot read current weather", True, mm_log.ERROR)
 	else:
 		tolog("...current weather retrieved")
 		try:
 			temp_current = weather_current["main"]["temp"]
-			tolog("...temperature %s" % (temp_current))
+			tolog("...temperature %s", args=(temp_current,))
 		except:
 			temp_current = '?'
 		try:
 			press_current = weather_current["main"]["pressure"]
-			tolog("...pression %s" % (press_current))
+			tolog("...pression %s", args=(press_current,))
 		except:
 			press_current = '?'
 		try:
 			humi_current = weather_current["main"]["humidity"]
-			tolog("...humidité %s" % (humi_current))
+			tolog("...humidité %s", args=(humi_current,))
 		except:
 			humi_current = '?'
 		try:
 			wind_current = ms_kmh(weather_current["wind"]["speed"])
-			tolog("...vent %s" % (wind_current))
+			tolog("...vent %s", args=(wind_current,))
 		except:
 			wind_current = '?'
 		try:
 			wind_dir = deg_dir(weather_current["wind"]["deg"])
-			tolog("...direction %s" % (wind_dir))
+			tolog("...direction %s", args=(wind_dir,))
 		except:
 			wind_dir = '?'
 		try:
 			sunrise = datetime.utcfromtimestamp(int(weather_current["sys"]["sunrise"])-tzone).strftime('%H:%M')
 			sunset = datetime.utcfromtimestamp(int(weather_current["sys"]["sunset"])-tzone).strftime('%H:%M')
-			tolog("...sunrise %s, sunset %s" % (sunrise, sunset))
+			tolog("...sunrise %s, sunset %s", args=(sunrise, sunset))
 		except:
 			sunrise = '?'
 			sunset = '?'
 		try:
 			utc = int(weather_current["dt"])
 			time_current = datetime.utcfromtimestamp(utc-tzone).strftime('à %H:%M')
-			tolog("...hour %s" % (time_current))
+			tolog("...hour %s", args=(time_current,))
 
 			code_current = remove_non_ascii(weather_current["weather"][0]["icon"])
 			# code_current = "01d"
@@ -553,8 +664,8 @@ def get_weather(city, country, openweather_ID):
 					weather_cur = WEATHER_CODE_MAPPING[code_current]
 			else:
 				weather_cur = '?'
-			tolog("...current weather is %s" % (weather_cur))
-			tolog("...current code is %s" % (code_current))
+			tolog("...current weather is %s", args=(weather_cur,))
+			tolog("...current code is %s", args=(code_current,))
 			weather_data = {
 				'utc': utc,
 				'time': time_current,
@@ -570,38 +681,43 @@ def get_weather(city, country, openweather_ID):
 			}
 
 		except Exception as e:
-			tolog("...error reading current weather: %s" % (e), True)
+			tolog("...error reading current weather: %s", True, mm_log.ERROR, (e,))
 
 	return weather_data
 
 
-def retrieve_weather(weather_city, country, openweather_ID):
-	for i in range(MAX_ITER):
-		weather_data = get_weather(weather_city, country, openweather_ID)
-		if weather_data != {}:
-			break
-		sleep(DELAY)
-	return weather_data
+@mm_metrics.timed('retrieve_weather')
+def retrieve_weather(weather_city, country, openweather_ID, deadline=None):
+	return retry(lambda: get_weather(weather_city, country, openweather_ID), lambda result: result != {}, deadline, OPENWEATHER_WEA)
 
 
 #-------------------------------------------------
 #		Forecast functions
 #-------------------------------------------------
 
+@mm_metrics.timed('get_forecast')
 def get_forecast(city, country, openweather_ID):
 	"""
 		Fetches forecast weather info for city, country, for the days following UTC
 	"""
-	forecast_data = {}
 	location_string = city + ',' + country
 
-	#----- Extract weather forecast data
-
 	tolog("Attempting to fetch forecast")
-	weather_forecast = fetch_weather(OPENWEATHER_FOR % (location_string, openweather_ID))
+	weather_forecast = fetch_weather(OPENWEATHER_FOR % (location_string, openweather_ID), FORECAST_TTL)
+	return parse_forecast(weather_forecast)
+
+
+@mm_metrics.timed('parse_forecast')
+def parse_forecast(weather_forecast):
+	"""
+		Extracts the forecast of the following days from the JSON response of openweather (see get_forecast)
+	"""
+	forecast_data = {}
+
+	#----- Extract weather forecast data
 
 	if weather_forecast == {} : # or weather_current == {}:
-		tolog("...error reading weather info: cannot read forecast weather", True)
+		tolog("...error reading weather info: cannot read forecast weather", True, mm_log.ERROR)
 		return {}
 
 	try:
@@ -663,17 +779,13 @@ def get_forecast(city, country, openweather_ID):
 			}
 
 	except Exception as e:
-		tolog("...error reading forecast weather: %s" % (e), True)
+		tolog("...error reading forecast weather: %s", True, mm_log.ERROR, (e,))
 	return forecast_data
 
 
-def retrieve_forecast(weather_city, country, openweather_ID):
-	for i in range(MAX_ITER):
-		forecast_data = get_forecast(weather_city, country, openweather_ID)
-		if forecast_data != {}:
-			break
-		sleep(DELAY)
-	return forecast_data
+@mm_metrics.timed('retrieve_forecast')
+def retrieve_forecast(weather_city, country, openweather_ID, deadline=None):
+	return retry(lambda: get_forecast(weather_city, country, openweather_ID), lambda result: result != {}, deadline, OPENWEATHER_FOR)
 
 
 #-------------------------------------------------
@@ -682,26 +794,28 @@ def retrieve_forecast(weather_city, country, openweather_ID):
 
 #---- Fetch tide info
 
+@mm_metrics.timed('get_tide')
 def get_tide(city):
 
 	tide_hours = []
 	tide_coef = ''
 
+	# Predicted locally when the harmonic constants of the port are known, scraped from TIDE_URL otherwise
+	tide = mm_tide.get_tide(city)
+	if tide is not None:
+		return tide
+	tolog("...no local tide prediction for %s, fetching from %s", args=(city, TIDE_URL % (city)))
+
 	tolog("Fetching tide info...")
 	try:
-		req = urllib2.Request(TIDE_URL % (city))
-		response_url = urllib2.urlopen(req)
-	# except urllib2.URLError as e:
-	# 	if hasattr(e, 'reason'):  # One reason (unsure what!)
-	# 		error = e.reason
-	# 	elif hasattr(e, 'code'):  # Another reason (unsure what!)
-	# 		error = e.code
+		response_url = mm_http.get(TIDE_URL % (city))
+		response_url.raise_for_status()
 	except Exception as error:
-		tolog("...error accessing tide server: %s" % (error), True)
+		tolog("...error accessing tide server: %s", True, mm_log.ERROR, (error,))
 		return ([], '')
 
 	try:
-		response = response_url.read()
+		response = response_url.text
 		pos = response.find("i_donnesJour", 0)
 		if pos == -1:
 			raise ValueError("No tag '%s' found in tide site" % ("i_donnesJour"))
@@ -719,7 +833,7 @@ def get_tide(city):
 			raise ValueError("Incoherent tide coef: %s" % (coef_text))
 
 		tide_coef = coef_text
-		tolog("Tide coef found: %s" % (tide_coef))
+		tolog("Tide coef found: %s", args=(tide_coef,))
 
 		tide_text, pos = extract_text(response, "<strong>", "</strong><", pos+1)
 		if pos == -1:
@@ -731,38 +845,34 @@ def get_tide(city):
 			raise ValueError("PM1 hour incoherent: %s" % (tide_text))
 
 		tide_hours.append(tide_text.replace('h', ':'))
-		tolog("PM1 found: %s" % (tide_text))
+		tolog("PM1 found: %s", args=(tide_text,))
 
 		tide_text, pos = extract_text(response, "<strong>", "</strong><", pos+1)
 		if pos == -1:
-			tolog("No 1st tag '%s' for PM2 found in tide site" % ("<strong>"))
+			tolog("No 1st tag '%s' for PM2 found in tide site", args=("<strong>",))
 			tide_hours.append('')
 			return tide_hours, tide_coef
 		tide_text, pos = extract_text(response, "<strong>", "</strong><", pos+1)
 		if pos == -1:
-			tolog("No 2nd tag '%s' for PM2 found in tide site" % ("<strong>"))
+			tolog("No 2nd tag '%s' for PM2 found in tide site", args=("<strong>",))
 			tide_hours.append('')
 			return tide_hours, tide_coef
 		if not match(r"[0-9][0-9]h[0-9][0-9]$", tide_text):
-			tolog("PM2 hour incoherent: %s" % (coef_text))
+			tolog("PM2 hour incoherent: %s", args=(coef_text,))
 			tide_hours.append('')
 			return tide_hours, tide_coef
 		tide_hours.append(tide_text.replace('h', ':'))
-		tolog("PM2 found: %s" % (tide_text))
+		tolog("PM2 found: %s", args=(tide_text,))
 
 		return tide_hours, tide_coef
 	except Exception as e:
-		tolog(e, True)
+		tolog(e, True, mm_log.ERROR)
 	return ([], '?')
 
 
-def retrieve_tide(tide_city):
-	for i in range(MAX_ITER):
-		tide_hours, tide_coef = get_tide(tide_city)
-		if tide_coef != '':
-			break
-		sleep(DELAY)
-	return tide_hours, tide_coef
+@mm_metrics.timed('retrieve_tide')
+def retrieve_tide(tide_city, deadline=None):
+	return retry(lambda: get_tide(tide_city), lambda result: result[1] != '', deadline, TIDE_URL)
 
 
 #-------------------------------------------------
@@ -837,9 +947,10 @@ def get_local_ip():
 
 #---- Read global IP
 
+@mm_metrics.timed('get_public_ip')
 def get_public_ip():
 	try:
-		public_ip = urllib2.urlopen('http://ip.42.pl/raw').read()
+		public_ip = mm_http.get(PUBLIC_IP_INFO).text
 		return public_ip
 	except Exception as e:
 		return "(unkown)"
@@ -848,19 +959,11 @@ def get_public_ip():
 
 #---- Retrieve IP information 
 
-def retrieve_IP():
-
-	for i in range(MAX_ITER):
-		local_IP = get_local_ip()
-		if local_IP != '':
-			break
-		sleep(DELAY)
+@mm_metrics.timed('retrieve_IP')
+def retrieve_IP(deadline=None):
 
-	for i in range(MAX_ITER):
-		public_IP = get_public_ip()
-		if public_IP != '':
-			break
-		sleep(DELAY)
+	local_IP = retry(get_local_ip, lambda result: result != '', deadline)
+	public_IP = retry(get_public_ip, lambda result: result != '', deadline)
 
 	cpu_temp = get_cpu_temp()
 	cpu_load = get_cpu_percent()
@@ -897,41 +1000,52 @@ def get_month(country):
 	return strftime('%B %Y')
 
 
+@mm_metrics.timed('import_google')
+def import_google():
+	"""
+	Imports the Google API client and OAuth stack on first call (it takes seconds on a Pi Zero)
+	"""
+	global google_imported
+
+	if not google_imported:
+		tolog("Importing Google API client...")
+		import googleapiclient.discovery  # Used by mm_calendar to build the service
+		import google_auth_oauthlib.flow  # Used by mm_credentials
+		import google.auth.transport.requests
+		google_imported = True
+	return
+
+
+@mm_metrics.timed('fetch_google_events')
 def fetch_google_events():
 	"""
 	Fetches the start and name of the next events on the user's calendar.
+	Only the changes since the previous call are fetched (see mm_calendar), and the events are served
+	from the local event store, even if the calendar cannot be reached.
 	"""
 
 	tolog("Fetching Google calendar...")
 	try:
-		creds = None
-		# The file token.pickle stores the user's access and refresh tokens, and is
-		# created automatically when the authorization flow completes for the first
-		# time.
-		if path.exists(PATH_PREFIX + 'token.pickle'):
-			with open(PATH_PREFIX + 'token.pickle', 'rb') as token:
-				creds = pickle.load(token)
-		# If there are no (valid) credentials available, let the user log in.
-		if not creds or not creds.valid:
-			if creds and creds.expired and creds.refresh_token:
-				creds.refresh(Request())
-			else:
-				flow = InstalledAppFlow.from_client_secrets_file(
-					PATH_PREFIX + 'credentials.json', SCOPES)
-				creds = flow.run_local_server(port=0)
-			# Save the credentials for the next run
-			with open(PATH_PREFIX + 'token.pickle', 'wb') as token:
-				pickle.dump(creds, token)
-
-		service = build('calendar', 'v3', credentials=creds)
-
-		# Call the Calendar API
-		now = datetime.utcnow().isoformat() + 'Z'  # 'Z' indicates UTC time
-		events_result = service.events().list(calendarId='primary', timeMin=now,
-										maxResults=10, singleEvents=True,
-										orderBy='startTime').execute()
-		events = events_result.get('items', [])
+		import_google()
+		# Credentials are kept in memory and refreshed before they expire (see mm_credentials)
+		creds = mm_credentials.get_credentials()
 
+		service = mm_calendar.get_service(creds)
+
+		# Call the Calendar API for the changes since the last call
+		mm_calendar.sync(service)
+
+	except Exception as e:
+		tolog("...error fetching calendar, serving the events stored: %s", True, mm_log.WARNING, (e,))
+
+	return parse_google_events(mm_calendar.upcoming(NB_EVENTS))
+
+
+def parse_google_events(events):
+	"""
+	Returns the list of events to display from the events of the Google Calendar API
+	"""
+	try:
 		event_list = []
 		# if iss_inview:
 		# 	event_name = {
@@ -973,7 +1087,7 @@ def fetch_google_events():
 		return event_list
 
 	except Exception as e:
-		tolog("...error fetching calendar: %s" % (e), True)
+		tolog("...error reading calendar events: %s", True, mm_log.ERROR, (e,))
 		return []
 
 #-------------------------------------------------
@@ -988,15 +1102,13 @@ if __name__ == "__main__":
 
 	city, country, tide_city, weather_city = decode_arg(argv)
 
+	start_refresh()
+
 	if city == "":
-		for i in range(MAX_ITER):
-			city, country = get_location()
-			if city != "":
-				break
-			sleep(DELAY)
+		city, country = retrieve_location()
 	
 	if city == "":
-		tolog("Too many attemps to fetch location info, I settle for %s, %s" %(city_default, country_default))
+		tolog("Too many attemps to fetch location info, I settle for %s, %s", args=(city_default, country_default))
 		city = city_default
 		country = country_default
 	
@@ -1006,17 +1118,13 @@ if __name__ == "__main__":
 		if tide_city == '':
 			tide_city = city
 		
-		tolog("Fetching tide info for %s" %(tide_city))
-		for i in range(MAX_ITER):
-			tide_hours, tide_coef = get_tide(tide_city)		
-			if tide_coef != '':
-				break
-			sleep(DELAY)
+		tolog("Fetching tide info for %s", args=(tide_city,))
+		tide_hours, tide_coef = retrieve_tide(tide_city)
 
 		if tide_coef == '':
 			tolog("Too many attemps to fetch tide info, I give up!")
 		elif tide_coef == '?':
-			tolog("Cannot fetch tide info for %s" % (tide_city))
+			tolog("Cannot fetch tide info for %s", args=(tide_city,))
 		else:
 			print("\nTide info for %s" % (tide_city))
 			print("Tide coefficient: %s" %(tide_coef))
@@ -1031,12 +1139,8 @@ if __name__ == "__main__":
 	if weather_city == '':
 		weather_city = city
 
-	tolog("Fetching weather info for %s (%s)" % (weather_city, country))
-	for i in range(MAX_ITER):
-		weather_data = get_weather(weather_city, country, openweather_ID)
-		if weather_data != {}:
-			break
-		sleep(DELAY)
+	tolog("Fetching weather info for %s (%s)", args=(weather_city, country))
+	weather_data = retrieve_weather(weather_city, country, openweather_ID)
 
 	if weather_data == {}:
 		tolog("Too many attemps to fetch weather info, I give up!")
@@ -1046,12 +1150,8 @@ if __name__ == "__main__":
 		print("Temperature: %s" % (weather_data['temp']))
 		print("Weather condition: %s (code %s)" %(weather_data['condition_name'], weather_data['condition_code']))
 
-		tolog("Fetching forecast info for %s (%s)" % (weather_city, country))
-		for i in range(MAX_ITER):
-			forecast_data = get_forecast(weather_city, country, openweather_ID)
-			if forecast_data != {}:
-				break
-			sleep(DELAY)
+		tolog("Fetching forecast info for %s (%s)", args=(weather_city, country))
+		forecast_data = retrieve_forecast(weather_city, country, openweather_ID)
 
 		if forecast_data == {}:
 			tolog("Too many attemps to fetch forecast info, I give up!")
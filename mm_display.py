@@ -25,6 +25,23 @@ Information displayed includes:
 
 HISTORY:
 --------
+17/10/26:
+- display_show compares the new frame with the last one pushed to the panel: no update if nothing changed,
+partial update of the changed regions if the driver allows it
+- Text rendered through an LRU cache of rasterized text runs (TEXT_CACHE_SIZE), repeated labels being a single paste
+(in any colour), measured with getbbox (getoffset and getsize with Pillow < 8)
+- Positions of the elements taken from the declarative layout of mm_layout (resources/layout.json) instead of constants,
+each display_* function building a list of draw operations which is then replayed by render
+- Retained scene of widgets (background, left, weather, forecast, calendar, info, title), each owning its bounding box,
+its last input and its draw operations: display_* functions only update their widget, and display_show redraws
+the widgets whose input has changed and passes the damaged rectangles to the panel driver
+- Output through the backends of mm_backend (Inky panel, memory or PNG/PBM file), the inky lib being only
+imported for the Inky panel, so that the rendering runs without the panel
+- draw_init, display_* functions and display_show measured by spans of mm_metrics
+- Logging through the buffered logger of mm_log, the messages of each icon and widget being debug ones
+- Fonts loaded on first use by the registry of mm_fonts, instead of at import
+- Icons loaded from the precompiled atlas of mm_atlas (memory-mapped, in the panel palette), PNG files used only if the atlas is missing or outdated
+
 20/7/20:
 - Cleanup of the code
 
@@ -56,12 +73,15 @@ Requires in current directory a subdirectory /resources with icon PNG files:
 - icon-surise.png: Icon for the sun rise
 - icon-sunset.png: Icon for the sun set
 
+The icons are precompiled into resources/icons.atlas by running: python mm_atlas.py
+
 Installation of the lib:
 	curl https://get.pimoroni.com/inky | bash
 
 
 SIDE EFFECTS:
 ------------
+Saves the last frame pushed to the panel in LAST_FRAME_FILENAME (kept in memory only if it is None)
 
 
 KNOWN BUGS:
@@ -77,12 +97,18 @@ KNOWN BUGS:
 
 from glob import glob
 from time import strftime
+from collections import OrderedDict
 from font_source_serif_pro import SourceSerifProSemibold
 # from font_source_sans_pro import SourceSansProSemibold
 from os import path
 
-from inky import InkyWHAT
-from PIL import Image, ImageFont, ImageDraw
+import mm_atlas
+import mm_backend
+import mm_fonts
+import mm_layout
+import mm_log
+import mm_metrics
+from PIL import Image, ImageDraw, ImageChops
 
 
 #-------------------------------------------------
@@ -90,8 +116,8 @@ from PIL import Image, ImageFont, ImageDraw
 #-------------------------------------------------
 
 PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
-LOG_FILENAME = PATH_PREFIX + "log_magicmirror.log"
 ICON_SOURCE = PATH_PREFIX + "resources/icon-*.png"
+LAST_FRAME_FILENAME = PATH_PREFIX + "last_frame.png"
 
 ICON_MAPPING = {
 	"01d": "sun",
@@ -124,10 +150,8 @@ ICON_MAPPING = {
 TIDENAME_FR = u'Marées :'
 TIDENAME = u'Tides:'
 
-FONT15 = ImageFont.truetype(SourceSerifProSemibold, 15)
-FONT18 = ImageFont.truetype(SourceSerifProSemibold, 18)
-FONT20 = ImageFont.truetype(SourceSerifProSemibold, 20)
-FONT24 = ImageFont.truetype(SourceSerifProSemibold, 24)
+FONT_FACE = SourceSerifProSemibold  # Loaded by mm_fonts on first use, at the sizes given in the layout
+FONT_DEFAULT = 20
 
 EPD_WIDTH = 400  # 212  #
 EPD_HEIGHT = 300  # 104  #
@@ -139,186 +163,102 @@ icons = {}
 
 image = {}
 
-NB_FORECASTS = 5  # Nb of days of forecast
+last_frame = None  # Last image pushed to the panel
+
+REGION_BAND = 20  # Height of the horizontal bands in which changed regions are searched
+PARTIAL_UPDATE = 'set_partial_mode'  # Method of the driver for partial updates, if it has one
+
 NB_EVENTS = 2  # Nb of events to display
 
 TEXT_OFFSET = 18
 
-TITLE_RECT_R = 399
-TITLE_RECT_B = 24
-TITLE_TEXT_H = 200
-TITLE_TEXT_V = 16
-
-INFO_TEXT_H = 5
-INFO_TEXT_LOCIP_V = 51
-INFO_TEXT_PUBIP_V = 73
-INFO_TEXT_CPU_V = 98
-
-EPHEM_RECT_T = 28
-EPHEM_RECT_R = 120
-EPHEM_RECT_B = 49
-EPHEM_TEXT_TITLE_H = 7
-EPHEM_TEXT_TITLE_V = 43
-EPHEM_ICON_RISE_H = 7
-EPHEM_ICON_RISE_V = 50
-EPHEM_TEXT_RISE_H = 57
-EPHEM_TEXT_RISE_V = 75
-EPHEM_ICON_SET_H = 7
-EPHEM_ICON_SET_V = 85
-EPHEM_TEXT_SET_H = 57
-EPHEM_TEXT_SET_V = 101
-
-WEA_ICON_COND_H = 30
-WEA_ICON_COND_V = 135
-WEA_TEXT_T_H = 22
-WEA_TEXT_T_V = 197
-WEA_TEXT_TEMP_H = 47
-WEA_TEXT_TEMP_V = 197
-WEA_ICON_WIND_H = 2
-WEA_ICON_WIND_V = 197
-WEA_TEXT_W_H = 47
-WEA_TEXT_W_V = 218
-WEA_TEXT_WIND_H = 72
-WEA_TEXT_WIND_V = 220
-WEA_TEXT_WINDDIR_H = 47
-WEA_TEXT_WINDDIR_V = 239
-WEA_RECT_T = 118
-WEA_RECT_R = 120
-WEA_RECT_B = 139
-WEA_RECT_B2 = 197
-WEA_TEXT6_H = 7
-WEA_TEXT6_V = 133
-
-FORCST_RECT1_L = 126
-FORCST_RECT1_T = 28
-FORCST_RECT1_R = 399
-FORCST_RECT1_B = 49
-FORCST_TEXT1_H = 155
-FORCST_TEXT1_H_INCR = 55
-FORCST_TEXT1_V = 43
-FORCST_TEXT2_H = 155
-FORCST_TEXT2_H_INCR = 55
-FORCST_TEXT2_V = 197
-FORCST_TEXT3_H = 155
-FORCST_TEXT3_H_INCR = 55
-FORCST_TEXT3_V = 218
-FORCST_TEXT4_H = 155
-FORCST_TEXT4_H_INCR = 55
-FORCST_TEXT4_V = 239
-FORCST_ICON1_H = 133
-FORCST_ICON1_H_INCR = 55
-FORCST_ICON1_V = 55
-FORCST_ICON2_H = 133
-FORCST_ICON2_H_INCR = 55
-FORCST_ICON2_V = 95
-FORCST_ICON3_H = 133
-FORCST_ICON3_H_INCR = 55
-FORCST_ICON3_V = 135
-FORCST_LINE1_L = 181
-FORCST_LINE1_L_INCR = 55
-FORCST_LINE1_T = 28
-FORCST_LINE1_R = 181
-FORCST_LINE1_R_INCR = 55
-FORCST_LINE1_B = 254
-FORCST_LINE1_B2 = 212
-FORCST_LINE2_L = 126
-FORCST_LINE2_T = 28
-FORCST_LINE2_R = 126
-FORCST_LINE2_R_INCR = 55
-FORCST_LINE2_B = 28
-
-TIDE_RECT_T = 28
-TIDE_RECT_R = 120
-TIDE_RECT_B = 49
-TIDE_TEXT1_H = 7
-TIDE_TEXT1_V = 43
-TIDE_ICON_L = 7
-TIDE_ICON_R = 59
-TIDE_TEXT2_H = 62
-TIDE_TEXT2_V = 70
-TIDE_TEXT3_H = 62
-TIDE_TEXT3_V = 91
-TIDE_TEXT4_H = 7
-TIDE_TEXT4_V = 112
-TIDE_TEXT5_H = 62
-TIDE_TEXT5_V = 112
-
-CAL_TEXT_L = 7
-CAL_TEXT_R = 275
-CAL_TEXT_R2 = 233
-CAL_TEXT_R_INCR = 21
-
-INIT_RECT1_T = 28
-INIT_RECT1_R = 120
-INIT_RECT1_B = 254
-INIT_RECT1_B2 = 212
-INIT_RECT2_L = 126
-INIT_RECT2_T = 28
-INIT_RECT2_R = 399
-INIT_RECT2_B = 254
-INIT_RECT2_B2 = 212
+TEXT_CACHE_SIZE = 128  # Max nb of rasterized text runs kept in the cache
+text_cache = OrderedDict()  # (font, text): (mask, offset, width), least recently used first
 
+SCENE_ORDER = ['background', 'left', 'weather', 'forecast', 'calendar', 'info', 'title']  # Widgets, from bottom to top
+scene = {}  # name: Widget
+damaged = []  # Boxes of the widgets removed or moved since the last render
 
-#-------------------------------------------------
-#--- FUNCTIONS -----------------------------------
-#-------------------------------------------------
 
 #-------------------------------------------------
-#		Useful functions
+#--- CLASSES -------------------------------------
 #-------------------------------------------------
 
-def remove_non_ascii(text):
+class Widget(object):
 	"""
-		Returns text where non-ascii chars have been removed
+		Widget of the retained scene: owns its bounding box, its last input and the draw operations built from it
 	"""
-	if type(text) is unicode:
-		text = ''.join(i for i in text if ord(i) < 128)
-	return text
 
+	def __init__(self, box, input, ops):
+		self.box = box
+		self.input = input
+		self.ops = ops
+		self.dirty = True
 
-def tolog(txt, forceprint = False):
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+#-------------------------------------------------
+#		Useful functions
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
 	"""
-		Saves information to logfile, and prints it if verbose or forceprint is on
+		Saves information txt % args to logfile (through the buffer of mm_log) at level, and prints it if verbose or forceprint is on
 	"""
-	txt = remove_non_ascii(txt)
-	if verbose or forceprint:
-		print(txt)
-	now = strftime('%Y/%m/%d %H:%M:%S')
-	msg = "%s\t%s" % (now, txt)
-	with open(LOG_FILENAME, 'a') as file:
-		file.write(msg + "\n")
+	mm_log.log(txt, verbose or forceprint, level, args)
 	return
 
 #-------------------------------------------------
 #		Display functions
 #-------------------------------------------------
 
+def get_font(size):
+	"""
+		Returns the font of the screen at size, loaded on first use
+	"""
+	return mm_fonts.get_font(FONT_FACE, size)
+
+
 def get_font15():
-	return FONT15
+	return get_font(15)
 
 
-def draw_init(rotate):
+@mm_metrics.timed('draw_init')
+def draw_init(rotate, backend='inky'):
+	"""
+		Initialises the screen, on the output backend (see mm_backend.get_backend)
+	"""
 	global icons
 	global image, inky_screen, draw
 
 	tolog("Initialising the screen...")
 
-	for icon in glob(ICON_SOURCE):
-		icon_name = icon.split("icon-")[1].replace(".png", "")
-		icon_image = Image.open(icon)
-		icons[icon_name] = icon_image
+	atlas = mm_atlas.load_atlas()
+	if atlas is not None:
+		icons = atlas
+	else:
+		tolog("...icon atlas missing or outdated (run mm_atlas.py), loading PNG files", True, mm_log.WARNING)
+		for icon in glob(ICON_SOURCE):
+			icon_name = icon.split("icon-")[1].replace(".png", "")
+			icon_image = Image.open(icon)
+			icons[icon_name] = icon_image
 
-	inky_screen = InkyWHAT('black')
+	inky_screen = mm_backend.get_backend(backend)
 	image = Image.new('P', (EPD_WIDTH, EPD_HEIGHT))
 	draw = ImageDraw.Draw(image)
+	scene.clear()
+	del damaged[:]
 
-	tolog("...inky screen initialised")
+	tolog("...screen initialised (backend %s)", args=(backend,))
 	return True
 
 
 def clear_display():
-
-	draw_rect(0, 0, EPD_WIDTH, EPD_HEIGHT, False)
+	layout = elements()
+	set_widget('background', layout['background.box']['coords'], 'clear', lambda: [draw_op(layout['screen.clear'])])
 	return
 
 
@@ -346,37 +286,71 @@ def draw_rect(x1, y1, x2, y2, fill = False):
 	return
 
 
-def draw_text(x1, y1, text, inverse=False, font=FONT20):
-	global draw
+def text_bbox(text, font):
+	"""
+		Returns the box (left, top, right, bottom) of the ink of text from its origin, measured by font.getbbox,
+		or by font.getoffset and font.getsize with Pillow < 8 (no getbbox)
+	"""
+	if hasattr(font, 'getbbox'):
+		return font.getbbox(text)
+	left, top = font.getoffset(text)
+	width, height = font.getsize(text)  # Measured from the ink left of or above the origin (negative offset)
+	return left, top, width + min(0, left), height + min(0, top)
 
-	if inverse:
-		draw.text([x1, y1 - TEXT_OFFSET], text, fill=inky_screen.WHITE, font=font)
-	else:
-		draw.text([x1, y1 - TEXT_OFFSET], text, fill=inky_screen.BLACK, font=font)
+
+def text_run(text, font):
+	"""
+		Returns the rasterized text run (mask, offset of the mask from the origin of the text, width) of text,
+		from the cache if it was already rendered (the mask being pasted with any colour)
+		The least recently used runs are evicted once the cache holds TEXT_CACHE_SIZE runs
+	"""
+	key = (font, text)  # Fonts are kept by mm_fonts, one object per face and size
+	run = text_cache.pop(key, None)
+	if run is None:
+		# The mask covers the ink of the glyphs, which may start left of or above the origin (negative bearing)
+		left, top, right, bottom = text_bbox(text, font)
+		mask = Image.new('1', (max(1, right - left), max(1, bottom - top)), 0)
+		ImageDraw.Draw(mask).text((-left, -top), text, fill=1, font=font)
+		run = (mask, (left, top), right - min(0, left))  # Width as measured by textsize, for the centering
+		if len(text_cache) >= TEXT_CACHE_SIZE:
+			text_cache.popitem(last=False)
+	text_cache[key] = run
+	return run
+
+
+def draw_text(x1, y1, text, inverse=False, font=None):
+	global image
+
+	if font is None:
+		font = get_font(FONT_DEFAULT)
+
+	colour = inky_screen.WHITE if inverse else inky_screen.BLACK
+	mask, (left, top), width = text_run(text, font)
+	image.paste(colour, (x1 + left, y1 - TEXT_OFFSET + top), mask)
 	return
 
 
-def draw_text_center(x, y, text, inverse=False, font=FONT20):
-	global draw
+def draw_text_center(x, y, text, inverse=False, font=None):
+	global image
 
-	width = draw.textsize(text, font=font)[0]
-	if inverse:
-		draw.text([x - width / 2, y - TEXT_OFFSET], text, fill=inky_screen.WHITE, font=font)
-	else:
-		draw.text([x - width / 2, y - TEXT_OFFSET], text, fill=inky_screen.BLACK, font=font)
+	if font is None:
+		font = get_font(FONT_DEFAULT)
+
+	colour = inky_screen.WHITE if inverse else inky_screen.BLACK
+	mask, (left, top), width = text_run(text, font)
+	image.paste(colour, (x - width // 2 + left, y - TEXT_OFFSET + top), mask)
 	return True
 
 
 def draw_icon(x, y, code):
 	global image, draw
 
-	tolog("Drawing icon...")
-	if code in ICON_MAPPING:
+	if code in ICON_MAPPING and ICON_MAPPING[code] in icons:
 		icon_current = ICON_MAPPING[code]
-		tolog("...icon %s displayed" % (icon_current))
+		mm_log.debug("...icon %s displayed", icon_current)
 		image.paste(icons[icon_current], (x, y))
 	else:
-		tolog("...no icon found", True)
+		tolog("...no icon found", True, mm_log.WARNING)
 		draw_text(x+8, y+10, '?')
 	return
 
@@ -384,7 +358,7 @@ def draw_icon(x, y, code):
 def draw_image(x, y, image_name):
 	global image, draw
 
-	tolog("Drawing image %s..." %(image_name))
+	mm_log.debug("Drawing image %s...", image_name)
 	try:
 		image_draw = Image.open(image_name)
 
@@ -393,32 +367,261 @@ def draw_image(x, y, image_name):
 		# hsize = int((float(img.size[1])*float(wpercent)))
 		image.paste(image_draw.resize((320, 240)), (x, y))
 	except Exception as e:
-		tolog("...error displaying image: %s" % (e), True)
+		tolog("...error displaying image: %s", True, mm_log.ERROR, (e,))
 	return
 
 
 
+def frame_indexes(frame):
+	"""
+		Returns the palette indexes of the 'P' frame as an 'L' image, so that frames can be compared
+	"""
+	return Image.frombytes('L', frame.size, frame.tobytes())
+
+
+def changed_regions(old_frame, new_frame):
+	"""
+		Returns the list of boxes (left, top, right, bottom) of the regions which differ between the two frames,
+		searched in horizontal bands of REGION_BAND pixels, adjacent bands being merged
+	"""
+	if old_frame is None or old_frame.size != new_frame.size:
+		return [(0, 0) + new_frame.size]
+
+	diff = ImageChops.difference(frame_indexes(old_frame), frame_indexes(new_frame))
+	if diff.getbbox() is None:
+		return []
+
+	regions = []
+	width, height = new_frame.size
+	for top in range(0, height, REGION_BAND):
+		bottom = min(height, top + REGION_BAND)
+		box = diff.crop((0, top, width, bottom)).getbbox()
+		if box is None:
+			continue
+		box = (box[0], top + box[1], box[2], top + box[3])
+		if regions and regions[-1][3] == top:
+			last = regions[-1]
+			regions[-1] = (min(last[0], box[0]), last[1], max(last[2], box[2]), box[3])
+		else:
+			regions.append(box)
+	return regions
+
+
+def load_last_frame():
+	"""
+		Returns the last frame pushed to the panel (kept in memory, or saved by a previous run)
+	"""
+	global last_frame
+
+	if last_frame is None and LAST_FRAME_FILENAME is not None and path.exists(LAST_FRAME_FILENAME):
+		try:
+			last_frame = Image.open(LAST_FRAME_FILENAME)
+			last_frame.load()
+		except Exception as e:
+			tolog("...error reading last frame: %s", True, mm_log.ERROR, (e,))
+	return last_frame
+
+
+def save_last_frame(frame):
+	"""
+		Keeps frame as the last one pushed to the panel
+	"""
+	global last_frame
+
+	last_frame = frame.copy()
+	if LAST_FRAME_FILENAME is None:
+		return
+	try:
+		last_frame.save(LAST_FRAME_FILENAME)
+	except Exception as e:
+		tolog("...error saving last frame: %s", True, mm_log.ERROR, (e,))
+	return
+
+
+@mm_metrics.timed('display_show')
 def display_show():
 	global image, inky_screen
 
 	tolog("Finishing display...")
+	damage = render_scene()
+	regions = changed_regions(load_last_frame(), image)
+	if regions == []:
+		tolog("...nothing changed, no update of the screen")
+		return True
+	if damage and last_frame is not None:
+		# Only the damaged rectangles where pixels have actually changed are refreshed
+		regions = [box for box in damage if any(intersects(box, region) for region in regions)]
+
 	inky_screen.set_image(image)
+	region = union(regions)
+	if hasattr(inky_screen, PARTIAL_UPDATE) and region != (0, 0) + image.size:
+		left, top, right, bottom = region
+		tolog("...partial update of region %s (%s damaged rectangles)", args=(region, len(regions)))
+		getattr(inky_screen, PARTIAL_UPDATE)(top, bottom, left, right)
+	else:
+		tolog("...full update (%s damaged rectangles)", args=(len(regions),))
 	inky_screen.show()
+	save_last_frame(image)
 	tolog("...display finished")
 
 	return True
 
 
+#-------------------------------------------------
+#		Layout functions
+#-------------------------------------------------
+
+def elements(wind_display=False):
+	"""
+		Returns the layout elements of the screen for the variant
+	"""
+	return mm_layout.get_layout(EPD_WIDTH, EPD_HEIGHT, wind_display)
+
+
+def draw_op(element, value=None):
+	"""
+		Returns the draw operation of the layout element, value being the text or the icon code to draw
+	"""
+	kind = element['kind']
+	if kind == 'rect':
+		return ('rect',) + element['coords'] + (element['fill'],)
+	if kind == 'line':
+		return ('line',) + element['coords']
+	if kind == 'text':
+		return ('text',) + element['coords'] + (value, element['inverse'], element['font'], element['align'])
+	return ('icon',) + element['coords'] + (value,)
+
+
+def render(ops):
+	"""
+		Replays the list of draw operations on the image
+	"""
+	for op in ops:
+		kind = op[0]
+		if kind == 'rect':
+			draw_rect(*op[1:])
+		elif kind == 'line':
+			draw_line(*op[1:])
+		elif kind == 'text':
+			x, y, text, inverse, font, align = op[1:]
+			if align == 'center':
+				draw_text_center(x, y, text, inverse, get_font(font))
+			else:
+				draw_text(x, y, text, inverse, get_font(font))
+		elif kind == 'icon':
+			draw_icon(*op[1:])
+	return
+
+
+#-------------------------------------------------
+#		Scene functions
+#-------------------------------------------------
+
+def intersects(box1, box2):
+	"""
+		Tests if the boxes (left, top, right, bottom) overlap
+	"""
+	return box1[0] < box2[2] and box2[0] < box1[2] and box1[1] < box2[3] and box2[1] < box1[3]
+
+
+def union(boxes):
+	"""
+		Returns the smallest box containing all the boxes
+	"""
+	return (
+		min(box[0] for box in boxes),
+		min(box[1] for box in boxes),
+		max(box[2] for box in boxes),
+		max(box[3] for box in boxes)
+	)
+
+
+def set_widget(name, box, input, build_ops):
+	"""
+		Updates the widget name with input: its draw operations are rebuilt by build_ops() and the widget
+		is marked to be redrawn only if input or box has changed since the last call
+	"""
+	widget = scene.get(name)
+	if widget is not None and widget.input == input and widget.box == box:
+		mm_log.debug("...%s unchanged", name)
+		return
+	ops = build_ops()
+	if widget is not None and widget.box != box:
+		damaged.append(widget.box)
+	scene[name] = Widget(box, input, ops)
+	return
+
+
+def remove_widget(name):
+	"""
+		Removes the widget name from the scene, its box being redrawn at next render
+	"""
+	if name in scene:
+		damaged.append(scene.pop(name).box)
+	return
+
+
+def set_target(target):
+	"""
+		Makes the draw_* functions draw on target, returns the previous target
+	"""
+	global image, draw
+
+	previous = image
+	image = target
+	draw = ImageDraw.Draw(image)
+	return previous
+
+
+def render_scene():
+	"""
+		Redraws the damaged parts of the image (boxes of the widgets changed, added or removed),
+		and returns the list of damaged boxes
+		The widgets overlapping the damage are replayed, from bottom to top, on a blank layer,
+		whose damaged boxes are then copied on the image
+	"""
+	damage = damaged + [scene[name].box for name in scene if scene[name].dirty]
+	del damaged[:]
+	if damage == []:
+		return []
+
+	frame = set_target(Image.new('P', (EPD_WIDTH, EPD_HEIGHT)))
+	for name in SCENE_ORDER:
+		if name in scene:
+			widget = scene[name]
+			if any(intersects(widget.box, box) for box in damage):
+				with mm_metrics.span('render_' + name):
+					try:
+						render(widget.ops)
+					except Exception as e:
+						tolog("...error drawing %s: %s", True, mm_log.ERROR, (name, e))  # The other widgets are still drawn
+			widget.dirty = False
+	layer = set_target(frame)
+
+	for box in damage:
+		image.paste(layer.crop(box), box[:2])
+	tolog("...%s damaged rectangles redrawn", args=(len(damage),))
+	return damage
+
+
 #-------------------------------------------------
 #		Display title
 #-------------------------------------------------
 
+def title_ops(text):
+	layout = elements()
+	return [
+		draw_op(layout['title.frame']),
+		draw_op(layout['title.text'], text)
+	]
+
+
+@mm_metrics.timed('display_title')
 def display_title(text):
 	"""
-		Displays the ephemeris data on inky display
+		Displays the title on inky display
 	"""
-	draw_rect(0, 0, TITLE_RECT_R, TITLE_RECT_B, False)
-	draw_text_center(TITLE_TEXT_H, TITLE_TEXT_V, text)
+	set_widget('title', elements()['title.box']['coords'], text, lambda: title_ops(text))
 
 	return True
 
@@ -427,17 +630,24 @@ def display_title(text):
 #		Display information
 #-------------------------------------------------
 
+@mm_metrics.timed('display_IP')
 def display_IP(city, local_IP, public_IP, info_CPU):
 	"""
 		Displays the IP and CPU data on inky display
 	"""
 	title = "%s %s" % (city, strftime('%d/%m %H:%M'))
 
+	for name in ['left', 'weather', 'forecast', 'calendar']:
+		remove_widget(name)
+	clear_display()
 	display_title(title)
 
-	draw_text(INFO_TEXT_H, INFO_TEXT_LOCIP_V, local_IP, False, FONT18)
-	draw_text(INFO_TEXT_H, INFO_TEXT_PUBIP_V, public_IP, False, FONT18)
-	draw_text(INFO_TEXT_H, INFO_TEXT_CPU_V, info_CPU, False, FONT18)
+	layout = elements()
+	set_widget('info', layout['info.box']['coords'], (local_IP, public_IP, info_CPU), lambda: [
+		draw_op(layout['info.local_ip'], local_IP),
+		draw_op(layout['info.public_ip'], public_IP),
+		draw_op(layout['info.cpu'], info_CPU)
+	])
 
 	return local_IP, public_IP, info_CPU
 
@@ -446,60 +656,108 @@ def display_IP(city, local_IP, public_IP, info_CPU):
 #		Main function to display forecast
 #-------------------------------------------------
 
+def ephem_ops(weather_data, country):
+	if country == 'Fr':
+		sun_name = u'Soleil :'
+	else:
+		sun_name = u'Sun:'
+
+	layout = elements()
+	return [
+		draw_op(layout['ephem.frame']),
+		draw_op(layout['ephem.title'], sun_name),
+		draw_op(layout['ephem.rise_icon'], 'rise'),
+		draw_op(layout['ephem.rise'], '%s' %(weather_data['sunrise'])),
+		draw_op(layout['ephem.set_icon'], 'set'),
+		draw_op(layout['ephem.set'], '%s' %(weather_data['sunset']))
+	]
+
+
+@mm_metrics.timed('display_ephem')
 def display_ephem(weather_data, country = 'Fr'):
 	"""
 		Displays the ephemeris data on inky display
 	"""
 	try:
-		tolog("Displaying ephemeris (Rising = %s, Setting = %s)..." % (weather_data['sunrise'], weather_data['sunset']))
-
-		if country == 'Fr':
-			sun_name = u'Soleil :'
-		else:
-			sun_name = u'Sun:'
-
-		draw_rect(0, EPHEM_RECT_T, EPHEM_RECT_R, EPHEM_RECT_B, True) 
-		draw_text(EPHEM_TEXT_TITLE_H, EPHEM_TEXT_TITLE_V, sun_name, True, FONT20)
-		draw_icon(EPHEM_ICON_RISE_H, EPHEM_ICON_RISE_V, 'rise')
-		draw_text(EPHEM_TEXT_RISE_H, EPHEM_TEXT_RISE_V, '%s' %(weather_data['sunrise']), False, FONT18)  
-		draw_icon(EPHEM_ICON_SET_H, EPHEM_ICON_SET_V, 'set')
-		draw_text(EPHEM_TEXT_SET_H, EPHEM_TEXT_SET_V, '%s' %(weather_data['sunset']), False, FONT18)  
+		tolog("Displaying ephemeris (Rising = %s, Setting = %s)...", args=(weather_data['sunrise'], weather_data['sunset']))
+		set_widget('left', elements()['left.box']['coords'], ('ephem', weather_data, country), lambda: ephem_ops(weather_data, country))
 		tolog("...display of ephemeris ok")
 		return True
 	except Exception as e:
-		tolog("...error displaying ephemeris: %s" % (e), True)
+		tolog("...error displaying ephemeris: %s", True, mm_log.ERROR, (e,))
 		return False
 
+
+def weather_ops(weather_data, wind_display):
+	layout = elements(wind_display)
+	ops = [
+		draw_op(layout['weather.icon'], weather_data['condition_code']),
+		draw_op(layout['weather.temp_label'], u"T°"),
+		draw_op(layout['weather.temp'], u"{:.0f}°C".format(weather_data['temp']))
+	]
+
+	if wind_display:
+		windir = weather_data['wind_dir']
+		ops += [
+			draw_op(layout['weather.wind_icon'], "wind"),
+			draw_op(layout['weather.wind'], "{:.0f}".format(weather_data['wind'])),
+			draw_op(layout['weather.wind_unit'], "km/h")
+		]
+		if windir != '?':
+			ops.append(draw_op(layout['weather.wind_dir'], "(%s)" %(windir)))
+
+	ops += [
+		draw_op(layout['weather.frame']),
+		draw_op(layout['weather.title'], u'Météo :')
+	]
+	return ops
+
+
+@mm_metrics.timed('display_weather')
 def display_weather(weather_data, wind_display):
 	"""
 		Displays the weather data on inky display
 	"""
-	tolog("Displaying current weather (Temp = %s, Time = %s, Cond = %s)..." % (weather_data['temp'], weather_data['time'], weather_data['condition_name']))
+	tolog("Displaying current weather (Temp = %s, Time = %s, Cond = %s)...", args=(weather_data['temp'], weather_data['time'], weather_data['condition_name']))
 
 	try:
+		set_widget('weather', elements(wind_display)['weather.box']['coords'], (weather_data, wind_display),
+			lambda: weather_ops(weather_data, wind_display))
+		tolog("...display of weather ok")
+		return True
+	except Exception as e:
+		tolog("...error displaying weather: %s", True, mm_log.ERROR, (e,))
+		return False
 
-		draw_icon(WEA_ICON_COND_H, WEA_ICON_COND_V, weather_data['condition_code']) 
-		draw_text(WEA_TEXT_T_H, WEA_TEXT_T_V, u"T°", False, FONT18) 
-		draw_text(WEA_TEXT_TEMP_H, WEA_TEXT_TEMP_V, u"{:.0f}°C".format(weather_data['temp']), False, FONT18) 
+
+def forecast_ops(forecast_data, wind_display):
+	layout = elements(wind_display)
+	ops = [draw_op(layout['forecast.frame'])]
+	for day in range(len(layout['forecast.day'])):
+		daily_forecast = forecast_data[day]
+		ops += [
+			draw_op(layout['forecast.day'][day], daily_forecast['nameday']),
+			draw_op(layout['forecast.temp'][day], u"{:.0f}/{:.0f}°".format(daily_forecast['temp_min'], daily_forecast['temp_max']))
+		]
 
 		if wind_display:
-			windir = weather_data['wind_dir']
-			draw_icon(WEA_ICON_WIND_H, WEA_ICON_WIND_V, "wind")
-			draw_text(WEA_TEXT_W_H, WEA_TEXT_W_V, "{:.0f}".format(weather_data['wind']), False, FONT18) 
-			draw_text(WEA_TEXT_WIND_H, WEA_TEXT_WIND_V, "km/h", False, FONT15) 
+			windir = daily_forecast['wind_max_dir']
+			ops.append(draw_op(layout['forecast.wind'][day], u"{:.0f}".format(daily_forecast['wind_max'])))
 			if windir != '?':
-				draw_text(WEA_TEXT_WINDDIR_H, WEA_TEXT_WINDDIR_V, "(%s)" %(windir), False, FONT18)  # 47, 233
+				ops.append(draw_op(layout['forecast.wind_dir'][day], "(%s)" % (windir)))
+		ops.append(draw_op(layout['forecast.separator'][day]))
 
-		draw_rect(0, WEA_RECT_T, WEA_RECT_R, WEA_RECT_B, True) 
+		for utc_time in daily_forecast['hours']:
+			mm_log.debug("Day = %s, Time = %s", day, utc_time)
+			icon_name = 'forecast.icon_' + utc_time
+			if icon_name in layout:
+				ops.append(draw_op(layout[icon_name][day], daily_forecast['hours'][utc_time]['condition_code']))
 
-		draw_text(WEA_TEXT6_H, WEA_TEXT6_V, u'Météo :', True, FONT20) 
-		tolog("...display of weather ok")
-		return True
-	except Exception as e:
-		tolog("...error displaying weather: %s" % (e), True)
-		return False
+	ops.append(draw_op(layout['forecast.top_line']))
+	return ops
 
 
+@mm_metrics.timed('display_forecast')
 def display_forecast(forecast_data, wind_display):
 	"""
 		Displays the forecast data on inky display
@@ -507,44 +765,13 @@ def display_forecast(forecast_data, wind_display):
 
 	tolog("Displaying current weather...")
 	try:
-		draw_rect(FORCST_RECT1_L, FORCST_RECT1_T, FORCST_RECT1_R, FORCST_RECT1_B, True)	
-		for day in range(NB_FORECASTS):
-			daily_forecast = forecast_data[day]
-			draw_text_center(FORCST_TEXT1_H + day * FORCST_TEXT1_H_INCR, FORCST_TEXT1_V, daily_forecast['nameday'], True, FONT18)
-			draw_text_center(FORCST_TEXT2_H + day * FORCST_TEXT2_H_INCR, FORCST_TEXT2_V,
-					u"{:.0f}/{:.0f}°".format(daily_forecast['temp_min'], daily_forecast['temp_max']), False, FONT18)	
-
-			if wind_display:
-				windir = daily_forecast['wind_max_dir']
-				draw_text_center(FORCST_TEXT3_H + day * FORCST_TEXT3_H_INCR, FORCST_TEXT3_V,
-						u"{:.0f}".format(daily_forecast['wind_max']), False, FONT18)	
-				if windir != '?':
-					draw_text_center(FORCST_TEXT4_H + day * FORCST_TEXT4_H_INCR, FORCST_TEXT4_V, "(%s)" % (windir), False, FONT18)	
-				draw_line(FORCST_LINE1_L + day * FORCST_LINE1_L_INCR, FORCST_LINE1_T, FORCST_LINE1_R + day * FORCST_LINE1_R_INCR, FORCST_LINE1_B)  
-			else:
-				draw_line(FORCST_LINE1_L + day * FORCST_LINE1_L_INCR, FORCST_LINE1_T, FORCST_LINE1_R + day * FORCST_LINE1_R_INCR, FORCST_LINE1_B2)  
-			
-			for utc_time in daily_forecast['hours']:
-				tolog("Day = %s, Time = %s" % (day, utc_time))
-				if utc_time == '09':
-					draw_icon(FORCST_ICON1_H + day * FORCST_ICON1_H_INCR, FORCST_ICON1_V,
-							daily_forecast['hours'][utc_time]['condition_code'])
-				if utc_time == '12':
-					draw_icon(FORCST_ICON2_H + day * FORCST_ICON2_H_INCR, FORCST_ICON2_V,
-										daily_forecast['hours'][utc_time]['condition_code']) 
-				if utc_time == '18':
-					draw_icon(FORCST_ICON3_H + day * FORCST_ICON3_H_INCR, FORCST_ICON3_V,
-										daily_forecast['hours'][utc_time]['condition_code'])
-
-		if wind_display:
-			draw_line(FORCST_LINE2_L, FORCST_LINE2_T, FORCST_LINE2_R + NB_FORECASTS + FORCST_LINE2_R_INCR, FORCST_LINE2_B)
-		else:
-			draw_line(FORCST_LINE2_L, FORCST_LINE2_T, FORCST_LINE2_R + NB_FORECASTS + FORCST_LINE2_R_INCR, FORCST_LINE2_B)
+		set_widget('forecast', elements(wind_display)['forecast.box']['coords'], (forecast_data, wind_display),
+			lambda: forecast_ops(forecast_data, wind_display))
 		tolog("...displaying ok")
 		return True
 
 	except Exception as e:
-		tolog("...error displaying ephemeris: %s" % (e), True)
+		tolog("...error displaying ephemeris: %s", True, mm_log.ERROR, (e,))
 		return False
 
 
@@ -552,39 +779,43 @@ def display_forecast(forecast_data, wind_display):
 #		Main function to display tide
 #-------------------------------------------------
 
+def tide_ops(tide_hours, tide_coef, country):
+	if country == 'Fr':
+		tide_name = TIDENAME_FR
+	else:
+		tide_name = TIDENAME
+
+	layout = elements()
+	ops = [
+		draw_op(layout['tide.frame']),
+		draw_op(layout['tide.title'], tide_name),
+		draw_op(layout['tide.icon'], 'hitide')
+	]
+	if len(tide_hours) > 0:
+		ops.append(draw_op(layout['tide.hour1'], '%s' %(tide_hours[0])))
+	if len(tide_hours) > 1:
+		ops.append(draw_op(layout['tide.hour2'], '%s' %(tide_hours[1])))
+	ops += [
+		draw_op(layout['tide.coef_label'], 'Coef'),
+		draw_op(layout['tide.coef'], '%s' % (tide_coef))
+	]
+	return ops
+
+
+@mm_metrics.timed('display_tide')
 def display_tide(tide_hours, tide_coef, country):
 	"""
 		Displays the tide info on inky display
 	"""
 
-	tolog("Displaying current tide (hours: %s, %s, Coeff: %s)..." % (tide_hours[0], tide_hours[1], tide_coef))
+	tolog("Displaying current tide (hours: %s, %s, Coeff: %s)...", args=(tide_hours[0], tide_hours[1], tide_coef))
 	try:
-
-		#----- Display tide info
-
-		if country == 'Fr':
-			# high_tide = "PM"
-			tide_name = TIDENAME_FR
-		else:
-			# high_tide = "Hi"
-			tide_name = TIDENAME
-
-		draw_rect(0, TIDE_RECT_T, TIDE_RECT_R, TIDE_RECT_B , True)
-		draw_text(TIDE_TEXT1_H, TIDE_TEXT1_V, tide_name, True, FONT20)
-		draw_icon(TIDE_ICON_L, TIDE_ICON_R, 'hitide')
-		if len(tide_hours) > 0:
-			# draw_text(7, 28 + 2 * 21, '%s 1' %(high_tide), False, FONT18)
-			draw_text(TIDE_TEXT2_H, TIDE_TEXT2_V, '%s' %(tide_hours[0]), False, FONT18)
-		if len(tide_hours) > 1:
-			# draw_text(7, 28 + 3 * 21, '%s 2' %(high_tide), False, FONT18)
-			draw_text(TIDE_TEXT3_H, TIDE_TEXT3_V, '%s' %(tide_hours[1]), False, FONT18)
-		draw_text(TIDE_TEXT4_H, TIDE_TEXT4_V, 'Coef', False, FONT18)
-		# draw_icon(7, 28 + 5 * 21 / 2, 'tidecoef')
-		draw_text(TIDE_TEXT5_H, TIDE_TEXT5_V, '%s' % (tide_coef), False, FONT18)
+		set_widget('left', elements()['left.box']['coords'], ('tide', tide_hours, tide_coef, country),
+			lambda: tide_ops(tide_hours, tide_coef, country))
 		tolog("...displaying ok")
 		return True
 	except Exception as e:
-		tolog("...error displaying tides: %s" % (e), True)
+		tolog("...error displaying tides: %s", True, mm_log.ERROR, (e,))
 		return False
 
 
@@ -592,6 +823,19 @@ def display_tide(tide_hours, tide_coef, country):
 #		Main function to display calendar
 #-------------------------------------------------
 
+def calendar_ops(event_list, wind_display):
+	slots = elements(wind_display)['calendar.event']
+	ops = []
+	for i in range(min(len(slots), len(event_list))):
+		if event_list[i]['time'] == '':
+			event_summary = "%s : %s" % (event_list[i]['date'], event_list[i]['summary'])
+		else:
+			event_summary = "%s, %s : %s" % (event_list[i]['date'], event_list[i]['time'][:-3], event_list[i]['summary'])
+		ops.append(draw_op(slots[i], event_summary))
+	return ops
+
+
+@mm_metrics.timed('display_calendar')
 def display_calendar(month_cal, day_list, monthname, today, event_list, wind_display):
 	"""
 		Displays the calendar info on inky display
@@ -599,27 +843,12 @@ def display_calendar(month_cal, day_list, monthname, today, event_list, wind_dis
 
 	tolog("Displaying Google calendar...")
 	try:
-		if len(event_list) != 0:
-			if wind_display:
-				nb_events = 2
-			else:
-				nb_events = 4
-			max_events = min(nb_events, len(event_list))
-			# if iss_inview :
-			# 	max_events -= 1
-			for i in range(max_events):
-				if event_list[i]['time'] == '':
-					event_summary = "%s : %s" % (event_list[i]['date'], event_list[i]['summary'])
-				else:
-					event_summary = "%s, %s : %s" % (event_list[i]['date'], event_list[i]['time'][:-3], event_list[i]['summary'])
-				if wind_display:
-					draw_text(CAL_TEXT_L, CAL_TEXT_R + i * CAL_TEXT_R_INCR, event_summary, False, FONT18)
-				else:
-					draw_text(CAL_TEXT_L, CAL_TEXT_R2 + i * CAL_TEXT_R_INCR, event_summary, False, FONT18)
+		set_widget('calendar', elements(wind_display)['calendar.box']['coords'], (event_list, wind_display),
+			lambda: calendar_ops(event_list, wind_display))
 		tolog("...displaying ok")
 		return True
 	except Exception as e:
-		tolog("...error displaying calendar: %s" % (e), True)
+		tolog("...error displaying calendar: %s", True, mm_log.ERROR, (e,))
 		return False
 
 
@@ -627,14 +856,19 @@ def display_calendar(month_cal, day_list, monthname, today, event_list, wind_dis
 #		Main function to initiate tide & weather display
 #-------------------------------------------------
 
+def init_ops(wind_display):
+	layout = elements(wind_display)
+	return [
+		draw_op(layout['screen.clear']),
+		draw_op(layout['screen.left']),
+		draw_op(layout['screen.right'])
+	]
+
+
+@mm_metrics.timed('init_display')
 def init_display(wind_display):
-	clear_display()
-	if wind_display:
-		draw_rect(0, INIT_RECT1_T, INIT_RECT1_R, INIT_RECT1_B, False)
-		draw_rect(INIT_RECT2_L, INIT_RECT2_T, INIT_RECT2_R, INIT_RECT2_B, False)
-	else:
-		draw_rect(0, INIT_RECT1_T, INIT_RECT1_R, INIT_RECT1_B2, False)
-		draw_rect(INIT_RECT2_L, INIT_RECT2_T, INIT_RECT2_R, INIT_RECT2_B2, False)
+	remove_widget('info')
+	set_widget('background', elements()['background.box']['coords'], wind_display, lambda: init_ops(wind_display))
 
 	return True
 
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_ephem.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_ephem.py"
+
+"""
+Version: 17/10/26
+
+Offline solar ephemeris of the magic mirror: sunrise, sunset, civil twilight and day length at the configured coordinates
+
+The times are computed with the equations of the NOAA solar calculator (declination of the sun and equation of time),
+for each day of the year at once: the table of the year is stored in TABLE_FILENAME, and recomputed only when the year
+or the coordinates change, so that the ephemeris of a refresh is a simple lookup, which never depends on the network.
+The times of the table are in minutes after midnight UTC, and converted to local time (summer time included) when read.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+
+
+USAGE:
+-----
+From another python program:
+load_config(config): reads the optional latitude and longitude (decimal degrees, East positive) of the [LOCATION]
+	section of the ConfigParser config
+get_ephem(day=None): returns the ephemeris of day (default today) at the configured coordinates, as a dict
+	{'sunrise', 'sunset', 'dawn', 'dusk', 'day_length'} of 'HH:MM' texts ('' if the sun does not rise or set),
+	or None if no coordinates are configured
+build_table(year, latitude, longitude): returns the table of the year, a list of [sunrise, sunset, dawn, dusk]
+	in minutes after midnight UTC (None if the sun does not rise or set)
+
+From the shell:
+python mm_ephem.py -lat latitude -lon longitude [-day YYYY/MM/DD]: prints the ephemeris of the day (default today)
+
+
+SIDE EFFECTS:
+------------
+Stores the table of the year in TABLE_FILENAME
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from calendar import isleap, timegm
+from datetime import date, datetime
+from json import dump, load
+from math import acos, asin, cos, degrees, radians, sin, tan
+from time import localtime, strftime
+from os import path, rename
+from sys import argv
+import threading
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+TABLE_FILENAME = PATH_PREFIX + "ephem_table.json"
+
+SUNRISE_ZENITH = 90.833  # Zenith angle of the sun at sunrise and sunset (refraction and radius of the disk), in degrees
+CIVIL_ZENITH = 96.0  # Zenith angle of the sun at the start and end of civil twilight, in degrees
+
+verbose = False
+
+latitude = None  # Coordinates in decimal degrees (East positive), None if not configured
+longitude = None
+
+table = None  # {'year', 'latitude', 'longitude', 'days': [[sunrise, sunset, dawn, dusk]]}, loaded on first use
+table_lock = threading.Lock()
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
+	"""
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
+	"""
+	mm_log.log(txt, verbose or forceprint, level, args)
+	return
+
+
+def load_config(config):
+	"""
+		Loads the optional coordinates from the ConfigParser config
+	"""
+	global latitude, longitude
+
+	if config.has_option('LOCATION', 'latitude') and config.has_option('LOCATION', 'longitude'):
+		latitude = config.getfloat('LOCATION', 'latitude')
+		longitude = config.getfloat('LOCATION', 'longitude')
+	return
+
+
+#-------------------------------------------------
+#		Computation functions
+#-------------------------------------------------
+
+def sun_position(julian_day):
+	"""
+		Returns the declination of the sun (degrees) and the equation of time (minutes) at julian_day (NOAA)
+	"""
+	t = (julian_day - 2451545.0) / 36525.0
+	mean_long = (280.46646 + t * (36000.76983 + t * 0.0003032)) % 360
+	anomaly = radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+	eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+	center = sin(anomaly) * (1.914602 - t * (0.004817 + 0.000014 * t)) + sin(2 * anomaly) * (0.019993 - 0.000101 * t) \
+		+ sin(3 * anomaly) * 0.000289
+	omega = radians(125.04 - 1934.136 * t)
+	apparent_long = radians(mean_long + center - 0.00569 - 0.00478 * sin(omega))
+	obliquity = radians(23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60 + 0.00256 * cos(omega))
+
+	declination = degrees(asin(sin(obliquity) * sin(apparent_long)))
+	y = tan(obliquity / 2) ** 2
+	l0 = radians(mean_long)
+	equation = 4 * degrees(y * sin(2 * l0) - 2 * eccentricity * sin(anomaly)
+		+ 4 * eccentricity * y * sin(anomaly) * cos(2 * l0) - 0.5 * y * y * sin(4 * l0)
+		- 1.25 * eccentricity * eccentricity * sin(2 * anomaly))
+	return declination, equation
+
+
+def hour_angle(latitude, declination, zenith):
+	"""
+		Returns the hour angle (degrees) of the sun at zenith, or None if the sun does not reach it
+	"""
+	lat = radians(latitude)
+	dec = radians(declination)
+	cos_angle = cos(radians(zenith)) / (cos(lat) * cos(dec)) - tan(lat) * tan(dec)
+	if not -1 <= cos_angle <= 1:
+		return None
+	return degrees(acos(cos_angle))
+
+
+def build_table(year, latitude, longitude):
+	"""
+		Returns the [sunrise, sunset, dawn, dusk] of each day of year, in minutes after midnight UTC
+	"""
+	days = []
+	first = date(year, 1, 1).toordinal()
+	for ordinal in range(first, first + (366 if isleap(year) else 365)):
+		julian_day = ordinal + 1721424.5 + 0.5 - longitude / 360.0  # Around the local noon
+		declination, equation = sun_position(julian_day)
+		noon = 720 - 4 * longitude - equation
+		times = []
+		for zenith in (SUNRISE_ZENITH, CIVIL_ZENITH):
+			angle = hour_angle(latitude, declination, zenith)
+			times += [None, None] if angle is None else [round(noon - 4 * angle, 1), round(noon + 4 * angle, 1)]
+		days.append(times)
+	return days
+
+
+#-------------------------------------------------
+#		Table functions
+#-------------------------------------------------
+
+def get_table(year):
+	"""
+		Returns the days of the table of year, loaded from TABLE_FILENAME or computed if it does not match
+	"""
+	global table
+
+	with table_lock:
+		if table is None:
+			try:
+				with open(TABLE_FILENAME, 'r') as file:
+					table = load(file)
+			except Exception:
+				table = {}
+		if (table.get('year'), table.get('latitude'), table.get('longitude')) != (year, latitude, longitude):
+			tolog("Computing ephemeris of %s for %s, %s...", args=(year, latitude, longitude))
+			table = {'year': year, 'latitude': latitude, 'longitude': longitude,
+				'days': build_table(year, latitude, longitude)}
+			try:
+				with open(TABLE_FILENAME + '.tmp', 'w') as file:
+					dump(table, file)
+				rename(TABLE_FILENAME + '.tmp', TABLE_FILENAME)
+			except Exception as e:
+				tolog("...error saving ephemeris table: %s", True, mm_log.ERROR, (e,))
+		return table['days']
+
+
+def get_ephem(day=None):
+	"""
+		Returns the ephemeris of day (default today) at the configured coordinates, or None if not configured
+	"""
+	if latitude is None or longitude is None:
+		return None
+	if day is None:
+		day = date.today()
+
+	sunrise, sunset, dawn, dusk = get_table(day.year)[day.timetuple().tm_yday - 1]
+	midnight = timegm(day.timetuple())
+
+	def local(minutes):
+		return '' if minutes is None else strftime('%H:%M', localtime(midnight + int(round(minutes * 60))))
+
+	if sunrise is None:  # Polar day or night, depending on the height of the sun at noon
+		declination = sun_position(day.toordinal() + 1721425.0 - longitude / 360.0)[0]
+		length = 1440 if abs(latitude - declination) < 90 else 0
+	else:
+		length = int(round(sunset - sunrise))
+	return {
+		'sunrise': local(sunrise),
+		'sunset': local(sunset),
+		'dawn': local(dawn),
+		'dusk': local(dusk),
+		'day_length': '%sh%02d' % (length // 60, length % 60)
+	}
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	day = None
+	n = 1
+	while n + 1 < len(argv):
+		if argv[n] == '-lat':
+			latitude = float(argv[n+1])
+		elif argv[n] == '-lon':
+			longitude = float(argv[n+1])
+		elif argv[n] == '-day':
+			day = datetime.strptime(argv[n+1], '%Y/%m/%d').date()
+		n += 2
+
+	ephem = get_ephem(day)
+	if ephem is None:
+		print("Coordinates required: python mm_ephem.py -lat latitude -lon longitude [-day YYYY/MM/DD]")
+	else:
+		print("Sunrise %(sunrise)s, sunset %(sunset)s, dawn %(dawn)s, dusk %(dusk)s, day length %(day_length)s" % ephem)
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_fonts.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_fonts.py"
+
+"""
+Version: 17/10/26
+
+Registry of the fonts used by the magic mirror programs
+
+Each font is loaded on its first use only, so that the runs which draw nothing (print-only or data-only)
+do not pay for the parsing of the TrueType files. The file of a face is read once and its data shared by all
+the sizes of the face, and the fonts loaded are kept, so that they stay warm between refreshes in daemon mode.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+
+
+USAGE:
+-----
+From another python program:
+get_font(face, size): returns the PIL font of the TrueType file face at size, loaded on first call
+
+PREREQUISITS:
+------------
+Installation of the lib:
+	pip install pillow
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from io import BytesIO
+import threading
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+faces = {}  # face: content of its TrueType file
+fonts = {}  # (face, size): font
+fonts_lock = threading.Lock()
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def get_face(face):
+	"""
+		Returns the content of the TrueType file face, read on first call (to be called with fonts_lock acquired)
+	"""
+	if face not in faces:
+		with open(face, 'rb') as file:
+			faces[face] = file.read()
+	return faces[face]
+
+
+def get_font(face, size):
+	"""
+		Returns the font of face at size, loaded on first call
+	"""
+	key = (face, size)
+	font = fonts.get(key)
+	if font is None:
+		from PIL import ImageFont
+
+		with fonts_lock:
+			font = fonts.get(key)
+			if font is None:
+				mm_log.debug("Loading font %s (%s)...", face, size)
+				font = ImageFont.truetype(BytesIO(get_face(face)), size)
+				fonts[key] = font
+	return font
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
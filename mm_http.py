@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_http.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_http.py"
+
+"""
+Version: 17/10/26
+
+Shared HTTP client used by all the fetchers of the magic mirror (weather, forecast, tide, location, IP)
+
+All requests go through a single requests.Session, so that connections are kept alive and reused
+between calls: the current weather and the forecast, which are both fetched on api.openweathermap.org,
+share the same warm connection instead of paying each time for DNS and the TCP handshake.
+
+Each upstream host is protected by a circuit breaker: after FAILURE_THRESHOLD consecutive failures
+(connection error, timeout or server error), the circuit of the host opens and the requests to it fail
+immediately with CircuitOpenError during OPEN_DELAY seconds; then a single request is let through
+as a probe (half-open circuit), which closes the circuit if it succeeds or opens it again if it fails.
+The state of the circuits is saved in CIRCUIT_FILENAME, so that it is kept between the runs launched by cron.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Added circuit breaker per host
+- Each request measured by a span of mm_metrics (wall time and bytes received)
+- Exponential backoff of the retries (backoff), shared by mm_data and mm_credentials
+
+
+USAGE:
+-----
+From another python program:
+load_config(config): reads the optional [HTTP] section of the ConfigParser config, with:
+	connectTimeout: max delay in seconds to connect to the server (default CONNECT_TIMEOUT)
+	readTimeout: max delay in seconds to wait for the server response (default READ_TIMEOUT)
+	poolHosts: nb of hosts for which connections are kept in the pool (default POOL_HOSTS)
+	poolPerHost: max nb of connections kept per host (default POOL_PER_HOST)
+	failureThreshold: nb of consecutive failures opening the circuit of a host (default FAILURE_THRESHOLD)
+	openDelay: delay in seconds before a probe is sent to a host whose circuit is open (default OPEN_DELAY)
+get(url): returns the requests response for url, using the shared session
+get_session(): returns the shared session (created on first call)
+is_open(url): returns True if the circuit of the host of url is open (requests to it fail fast)
+backoff(attempt): returns the delay in seconds before the next attempt, after attempt failed ones (from 0)
+
+
+PREREQUISITS:
+------------
+Installation of the lib:
+	pip install requests
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+import threading
+from json import dump, load
+from time import time
+from random import uniform
+from os import path, rename
+from requests import Session, RequestException
+from requests.adapters import HTTPAdapter
+import mm_metrics
+
+try:
+	from urllib.parse import urlparse
+except ImportError:
+	from urlparse import urlparse
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+CIRCUIT_FILENAME = PATH_PREFIX + "circuits.json"
+
+CONNECT_TIMEOUT = 5  # Max delay to connect to a server, in seconds
+READ_TIMEOUT = 20  # Max delay to receive the server response, in seconds
+POOL_HOSTS = 4  # Nb of hosts for which connections are kept alive
+POOL_PER_HOST = 2  # Max nb of connections kept alive per host
+
+FAILURE_THRESHOLD = 3  # Nb of consecutive failures opening the circuit of a host
+OPEN_DELAY = 300  # Delay during which an open circuit fails fast before a probe is let through, in seconds
+
+BACKOFF_BASE = 2  # Delay before the first retry in seconds, doubled after each failed attempt (up to BACKOFF_MAX)
+BACKOFF_MAX = 1200  # Max delay between two retries in seconds
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+session = None
+session_lock = threading.Lock()
+
+circuits = None  # host: {'state': ..., 'failures': ..., 'opened': ...}, loaded from CIRCUIT_FILENAME on first use
+circuit_lock = threading.Lock()
+
+
+#-------------------------------------------------
+#--- CLASSES -------------------------------------
+#-------------------------------------------------
+
+class CircuitOpenError(Exception):
+	"""
+		Raised instead of sending a request to a host whose circuit is open
+	"""
+	pass
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def load_config(config):
+	"""
+	Loads the optional HTTP parameters from the ConfigParser config
+	"""
+	global CONNECT_TIMEOUT, READ_TIMEOUT, POOL_HOSTS, POOL_PER_HOST
+	global FAILURE_THRESHOLD, OPEN_DELAY
+
+	if not config.has_section('HTTP'):
+		return
+	CONNECT_TIMEOUT = config.getfloat('HTTP', 'connectTimeout', fallback=CONNECT_TIMEOUT)
+	READ_TIMEOUT = config.getfloat('HTTP', 'readTimeout', fallback=READ_TIMEOUT)
+	POOL_HOSTS = config.getint('HTTP', 'poolHosts', fallback=POOL_HOSTS)
+	POOL_PER_HOST = config.getint('HTTP', 'poolPerHost', fallback=POOL_PER_HOST)
+	FAILURE_THRESHOLD = config.getint('HTTP', 'failureThreshold', fallback=FAILURE_THRESHOLD)
+	OPEN_DELAY = config.getfloat('HTTP', 'openDelay', fallback=OPEN_DELAY)
+	return
+
+
+def get_session():
+	"""
+	Returns the shared session, creating it on first call
+	"""
+	global session
+
+	with session_lock:
+		if session is None:
+			adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST)
+			session = Session()
+			session.mount('http://', adapter)
+			session.mount('https://', adapter)
+	return session
+
+
+#-------------------------------------------------
+#		Circuit breaker functions
+#-------------------------------------------------
+
+def get_circuit(host):
+	"""
+	Returns the circuit of host (to be called with circuit_lock acquired)
+	"""
+	global circuits
+
+	if circuits is None:
+		try:
+			with open(CIRCUIT_FILENAME, 'r') as file:
+				circuits = load(file)
+		except Exception:
+			circuits = {}
+	if host not in circuits:
+		circuits[host] = {'state': CLOSED, 'failures': 0, 'opened': 0}
+	return circuits[host]
+
+
+def save_circuits():
+	"""
+	Saves the state of the circuits (to be called with circuit_lock acquired)
+	"""
+	try:
+		with open(CIRCUIT_FILENAME + '.tmp', 'w') as file:
+			dump(circuits, file)
+		rename(CIRCUIT_FILENAME + '.tmp', CIRCUIT_FILENAME)
+	except Exception:
+		pass
+	return
+
+
+def is_open(url):
+	"""
+	Returns True if requests to the host of url currently fail fast
+	"""
+	with circuit_lock:
+		circuit = get_circuit(urlparse(url).netloc)
+		if circuit['state'] == OPEN:
+			return time() - circuit['opened'] < OPEN_DELAY
+		return circuit['state'] == HALF_OPEN
+
+
+def backoff(attempt):
+	"""
+	Returns the delay before the attempt following attempt failed ones (from 0): exponential backoff with full jitter
+	"""
+	return uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def circuit_before(host):
+	"""
+	Raises CircuitOpenError if the request to host shall not be sent
+	"""
+	with circuit_lock:
+		circuit = get_circuit(host)
+		if circuit['state'] == CLOSED:
+			return
+		if circuit['state'] == OPEN and time() - circuit['opened'] >= OPEN_DELAY:
+			circuit['state'] = HALF_OPEN  # This request is the probe
+			circuit['opened'] = time()
+			return
+		if circuit['state'] == HALF_OPEN and time() - circuit['opened'] >= OPEN_DELAY:
+			circuit['opened'] = time()  # Previous probe never reported back
+			return
+	raise CircuitOpenError("circuit open for %s" % (host))
+
+
+def circuit_after(host, ok):
+	"""
+	Records the result of a request to host, opening or closing its circuit
+	"""
+	with circuit_lock:
+		circuit = get_circuit(host)
+		if ok:
+			if circuit['state'] != CLOSED or circuit['failures'] != 0:
+				circuit.update({'state': CLOSED, 'failures': 0, 'opened': 0})
+				save_circuits()
+			return
+		circuit['failures'] += 1
+		if circuit['state'] == HALF_OPEN or circuit['failures'] >= FAILURE_THRESHOLD:
+			circuit.update({'state': OPEN, 'opened': time()})
+		save_circuits()
+	return
+
+
+#-------------------------------------------------
+#		Request functions
+#-------------------------------------------------
+
+def get(url):
+	"""
+	Fetches url with the shared session and returns the response
+	Raises CircuitOpenError without sending anything if the circuit of the host is open
+	"""
+	host = urlparse(url).netloc
+	circuit_before(host)
+	with mm_metrics.span('http ' + host):
+		try:
+			response = get_session().get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+		except RequestException:
+			circuit_after(host, False)
+			raise
+		mm_metrics.add_bytes(len(response.content))
+	circuit_after(host, response.status_code < 500)
+	return response
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
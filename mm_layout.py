@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_layout.py						#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_layout.py"
+
+"""
+Version: 17/10/26
+
+Layout engine of the magic mirror screen: loads once the declarative description of the screen (LAYOUT_FILENAME),
+and precomputes the absolute position of every element, for each panel size and each variant (with or without wind)
+
+The description holds, for each panel size ("400x300"), the elements of the screen by name ("widget.element"), with:
+- the kind and position of the element: "rect": [left, top, right, bottom], "line": [x1, y1, x2, y2],
+"text": [x, y], "icon": [x, y], or "box": [left, top, right, bottom] for the bounding box of a widget (right and bottom excluded)
+- for texts: "font" (size), "align" ("left" or "center"), "inverse" (white on black)
+- for rectangles: "fill" (black)
+- "repeat": [count, dx, dy] to repeat the element count times, shifted by dx, dy each time (eg the days of the forecast)
+- "wind": values replacing the ones above when the wind is displayed
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Added "box" elements, bounding boxes of the widgets
+
+
+USAGE:
+-----
+From another python program:
+get_layout(width, height, wind_display): returns the dict name: element (or list of elements for repeated ones)
+	for the panel size and variant, where element is a dict with 'kind', 'coords' and, for texts, 'font', 'align', 'inverse',
+	for rectangles, 'fill'
+	Layouts are computed once and then kept in memory
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from json import load
+from os import path
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+LAYOUT_FILENAME = PATH_PREFIX + "resources/layout.json"
+
+KINDS = ['rect', 'line', 'text', 'icon', 'box']
+
+description = None  # Content of LAYOUT_FILENAME
+layouts = {}  # (width, height, wind_display): precomputed layout
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def load_description():
+	"""
+		Returns the description of the screen, loaded from LAYOUT_FILENAME on first call
+	"""
+	global description
+
+	if description is None:
+		with open(LAYOUT_FILENAME, 'r') as file:
+			description = load(file)
+	return description
+
+
+def shift(kind, coords, dx, dy):
+	"""
+		Returns the coordinates of an element of kind shifted by dx, dy
+	"""
+	if kind in ('rect', 'line', 'box'):
+		return (coords[0] + dx, coords[1] + dy, coords[2] + dx, coords[3] + dy)
+	return (coords[0] + dx, coords[1] + dy)
+
+
+def compute_element(spec, wind_display):
+	"""
+		Returns the precomputed element (or list of elements if repeated) described by spec for the variant
+	"""
+	spec = dict(spec)
+	variant = spec.pop('wind', {})
+	if wind_display:
+		spec.update(variant)
+
+	kind = [k for k in KINDS if k in spec][0]
+	element = {
+		'kind': kind,
+		'coords': tuple(spec[kind]),
+		'font': spec.get('font', 20),
+		'align': spec.get('align', 'left'),
+		'inverse': spec.get('inverse', False),
+		'fill': spec.get('fill', False)
+	}
+	if 'repeat' not in spec:
+		return element
+
+	count, dx, dy = spec['repeat']
+	elements = []
+	for i in range(count):
+		repeated = dict(element)
+		repeated['coords'] = shift(kind, element['coords'], i * dx, i * dy)
+		elements.append(repeated)
+	return elements
+
+
+def get_layout(width, height, wind_display):
+	"""
+		Returns the precomputed layout for the panel size and variant (see module doc)
+	"""
+	key = (width, height, bool(wind_display))
+	if key not in layouts:
+		specs = load_description()["%sx%s" % (width, height)]
+		layout = {}
+		for name in specs:
+			layout[name] = compute_element(specs[name], wind_display)
+		layouts[key] = layout
+	return layouts[key]
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_log.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_log.py"
+
+"""
+Version: 17/10/26
+
+Logger shared by the programs of the magic mirror
+
+The messages are kept in an in-memory buffer, written to the log file by a background thread every FLUSH_DELAY
+seconds (or as soon as FLUSH_SIZE messages are waiting), in a single append, instead of opening the file for each
+message: a render no longer causes dozens of small writes on the SD card. The buffer is flushed when the program exits.
+
+The messages below the level LEVEL are dropped before being formatted, so that the debug messages of the hot paths
+(eg each icon drawn) cost almost nothing when they are not logged.
+
+The log files are rotated when they exceed MAX_SIZE bytes or when their first message is older than MAX_AGE seconds:
+the file is then compressed into a segment <log file>.<start time>.gz, only the last MAX_SEGMENTS segments being kept.
+The start and end times of the segments are kept in an index (<log file>.index), so that the messages of a time window
+are read from the segments covering it only.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Rotation of the log files by size and age, older segments compressed with gzip and indexed by time
+
+
+USAGE:
+-----
+From another python program:
+log(txt, printed=False, level=INFO, args=(), filename=LOG_FILENAME): logs the message txt % args (txt if no args)
+	in filename, if level is at least LEVEL, and prints it if printed
+debug(txt, *args), info(txt, *args): logs the message txt % args at level DEBUG or INFO
+error(txt, *args): logs and prints the message txt % args at level ERROR
+flush(): writes the messages waiting in the buffer
+load_config(config): reads the optional [LOG] section of the ConfigParser config, with:
+	level: debug, info, warning or error (default info)
+	maxSize: max size of a log file before it is rotated, in KB (default MAX_SIZE)
+	maxAge: max age of the first message of a log file before it is rotated, in days (default MAX_AGE)
+	maxSegments: nb of compressed segments kept (default MAX_SEGMENTS)
+remove_non_ascii(text): returns text where non-ascii chars have been removed
+segments(start, end, filename=LOG_FILENAME): returns the files (segments and current log) holding the messages
+	between the times start and end
+read(start, end, filename=LOG_FILENAME): returns the lines of the messages logged between the times start and end
+
+From the shell:
+python mm_log.py [-from "YYYY/MM/DD HH:MM"] [-to "YYYY/MM/DD HH:MM"] [-log file]: prints the messages logged in the window
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from time import strftime, strptime, localtime, mktime, time
+from json import dump, load
+from os import path, remove, rename
+from shutil import copyfileobj
+from sys import argv
+import atexit
+import gzip
+import threading
+
+try:
+	text_type = unicode
+except NameError:
+	text_type = str
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+LOG_FILENAME = PATH_PREFIX + "log_magicmirror.log"
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+
+LEVEL = INFO  # Messages below this level are not logged
+FLUSH_DELAY = 5  # Max delay before a message is written, in seconds
+FLUSH_SIZE = 200  # Nb of messages waiting which triggers a write
+
+MAX_SIZE = 1024 * 1024  # Size of a log file triggering its rotation, in bytes
+MAX_AGE = 7 * 86400  # Age of the first message of a log file triggering its rotation, in seconds
+MAX_SEGMENTS = 10  # Nb of compressed segments kept per log file
+TIME_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+buffer = []  # (time, filename, message) waiting to be written
+buffer_lock = threading.Condition()
+write_lock = threading.Lock()  # Keeps the writes of the thread and of flush in order
+writer = None
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def remove_non_ascii(text):
+	"""
+		Returns text where non-ascii chars have been removed
+	"""
+	if isinstance(text, text_type):
+		text = text.encode('ascii', 'ignore').decode('ascii')
+	return text
+
+
+def load_config(config):
+	"""
+		Loads the optional log parameters from the ConfigParser config
+	"""
+	global LEVEL, MAX_SIZE, MAX_AGE, MAX_SEGMENTS
+
+	if config.has_section('LOG'):
+		LEVEL = LEVELS.get(config.get('LOG', 'level', fallback='info').lower(), INFO)
+		MAX_SIZE = config.getint('LOG', 'maxSize', fallback=MAX_SIZE // 1024) * 1024
+		MAX_AGE = config.getfloat('LOG', 'maxAge', fallback=MAX_AGE / 86400.0) * 86400
+		MAX_SEGMENTS = config.getint('LOG', 'maxSegments', fallback=MAX_SEGMENTS)
+	return
+
+
+#-------------------------------------------------
+#		Rotation functions
+#-------------------------------------------------
+
+def load_index(filename):
+	"""
+		Returns the index of the log file: {'current': start time of the log file, 'segments': [{'file', 'start', 'end'}]}
+	"""
+	try:
+		with open(filename + '.index', 'r') as file:
+			return load(file)
+	except Exception:
+		return {'current': None, 'segments': []}
+
+
+def save_index(filename, index):
+	with open(filename + '.index.tmp', 'w') as file:
+		dump(index, file)
+	rename(filename + '.index.tmp', filename + '.index')
+	return
+
+
+def first_time(filename):
+	"""
+		Returns the time of the first message of the log file, or None
+	"""
+	try:
+		with open(filename, 'r') as file:
+			return mktime(strptime(file.readline()[:19], TIME_FORMAT))
+	except Exception:
+		return None
+
+
+def rotate(filename, index, now):
+	"""
+		Compresses the log file into a new segment, added to the index, and drops the oldest segments
+	"""
+	start = index['current']
+	stamp = strftime('%Y%m%d-%H%M%S', localtime(start))
+	segment = "%s.%s.gz" % (filename, stamp)
+	n = 1
+	while path.exists(segment):  # Several rotations within the same second
+		segment = "%s.%s-%s.gz" % (filename, stamp, n)
+		n += 1
+	rename(filename, filename + '.rotating')  # The next messages go to a new log file
+	with open(filename + '.rotating', 'rb') as source:
+		with gzip.open(segment, 'wb') as target:
+			copyfileobj(source, target)
+	remove(filename + '.rotating')
+
+	index['segments'].append({'file': path.basename(segment), 'start': start, 'end': now})
+	while len(index['segments']) > MAX_SEGMENTS:
+		oldest = index['segments'].pop(0)
+		try:
+			remove(path.join(path.dirname(filename), oldest['file']))
+		except OSError:
+			pass
+	index['current'] = None
+	return
+
+
+def check_rotation(filename, now):
+	"""
+		Rotates the log file if it exceeds MAX_SIZE or MAX_AGE, and keeps the start time of the current log file indexed
+	"""
+	index = load_index(filename)
+	current = index['current']
+	if not path.exists(filename):
+		current = None
+	elif current is None:
+		current = first_time(filename)
+	if current is not None and (path.getsize(filename) >= MAX_SIZE or now - current >= MAX_AGE):
+		index['current'] = current
+		rotate(filename, index, now)
+		current = None
+	if current is None:
+		current = now
+	if current != index['current']:
+		index['current'] = current
+		save_index(filename, index)
+	return
+
+
+def segments(start, end, filename=LOG_FILENAME):
+	"""
+		Returns the files holding the messages logged between the times start and end, oldest first
+	"""
+	index = load_index(filename)
+	files = []
+	for segment in index['segments']:
+		if segment['start'] <= end and segment['end'] >= start:
+			files.append(path.join(path.dirname(filename), segment['file']))
+	if path.exists(filename) and (index['current'] is None or index['current'] <= end):
+		files.append(filename)
+	return files
+
+
+def read(start, end, filename=LOG_FILENAME):
+	"""
+		Returns the lines of the messages logged between the times start and end
+	"""
+	flush()
+	first = strftime(TIME_FORMAT, localtime(start))
+	last = strftime(TIME_FORMAT, localtime(end))
+	lines = []
+	for name in segments(start, end, filename):
+		opener = gzip.open if name.endswith('.gz') else open
+		with opener(name, 'rb') as file:
+			for line in file:
+				line = line.decode('ascii', 'ignore').rstrip('\n')
+				if first <= line[:19] <= last:
+					lines.append(line)
+	return lines
+
+
+#-------------------------------------------------
+#		Writing functions
+#-------------------------------------------------
+
+def write(messages):
+	"""
+		Appends the messages to their log files, one write per file
+	"""
+	lines = {}
+	for timestamp, filename, txt in messages:
+		now = strftime(TIME_FORMAT, localtime(timestamp))
+		lines.setdefault(filename, []).append("%s\t%s\n" % (now, remove_non_ascii(txt)))
+	for filename in lines:
+		try:
+			check_rotation(filename, time())
+		except Exception as e:
+			print("Error rotating log %s: %s" % (filename, e))
+		try:
+			with open(filename, 'a') as file:
+				file.write(''.join(lines[filename]))
+		except Exception as e:
+			print("Error writing log %s: %s" % (filename, e))
+	return
+
+
+def flush():
+	"""
+		Writes the messages waiting in the buffer
+	"""
+	with write_lock:
+		with buffer_lock:
+			messages = buffer[:]
+			del buffer[:]
+		if messages:
+			write(messages)
+	return
+
+
+def run_writer():
+	"""
+		Background thread writing the buffer every FLUSH_DELAY seconds, or sooner when it is full
+	"""
+	while True:
+		with buffer_lock:
+			if len(buffer) < FLUSH_SIZE:
+				buffer_lock.wait(FLUSH_DELAY)
+		flush()
+
+
+def start_writer():
+	"""
+		Starts the background writer, on first message
+	"""
+	global writer
+
+	writer = threading.Thread(target=run_writer)
+	writer.daemon = True  # The buffer is flushed at exit, the thread shall not keep the program running
+	writer.start()
+	atexit.register(flush)
+	return
+
+
+#-------------------------------------------------
+#		Logging functions
+#-------------------------------------------------
+
+def log(txt, printed=False, level=INFO, args=(), filename=LOG_FILENAME):
+	"""
+		Logs the message txt % args if level is at least LEVEL, and prints it if printed
+	"""
+	if level < LEVEL and not printed:
+		return
+	if args:
+		txt = txt % args
+	if printed:
+		print(remove_non_ascii(txt))
+	if level < LEVEL:
+		return
+
+	with buffer_lock:
+		if writer is None:
+			start_writer()
+		buffer.append((time(), filename, txt))
+		if len(buffer) >= FLUSH_SIZE:
+			buffer_lock.notify()
+	return
+
+
+def debug(txt, *args):
+	log(txt, False, DEBUG, args)
+
+
+def info(txt, *args):
+	log(txt, False, INFO, args)
+
+
+def error(txt, *args):
+	log(txt, True, ERROR, args)
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	start = 0
+	end = time()
+	filename = LOG_FILENAME
+	n = 1
+	while n + 1 < len(argv):
+		if argv[n] == '-from':
+			start = mktime(strptime(argv[n+1], '%Y/%m/%d %H:%M'))
+		elif argv[n] == '-to':
+			end = mktime(strptime(argv[n+1], '%Y/%m/%d %H:%M')) + 59
+		elif argv[n] == '-log':
+			filename = path.abspath(argv[n+1])
+		n += 2
+
+	for line in read(start, end, filename):
+		print(line)
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
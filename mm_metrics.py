@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_metrics.py						#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_metrics.py"
+
+"""
+Version: 17/10/26
+
+Timing of the stages of a refresh of the magic mirror (fetchers, retries, HTTP requests, display calls)
+
+Each stage is measured by a span, which records its wall time, the nb of retries and the nb of bytes
+received while it was running (retries and bytes are counted for all the spans opened in the same thread,
+eg the bytes of an HTTP request count for the request, the fetcher and the retrieve_* function calling it).
+
+The spans of a refresh are logged, and saved when the refresh ends in METRICS_FILENAME, which keeps the last
+MAX_RUNS refreshes and a summary, per stage, of the last SUMMARY_RUNS ones.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Logging through the buffered logger of mm_log
+
+
+USAGE:
+-----
+From the shell:
+python mm_metrics.py [-n nb]: prints the summary of the last nb refreshes (default SUMMARY_RUNS)
+
+From another python program:
+with span(name): ...: measures the block as the stage name
+@timed(name): measures each call of the decorated function as the stage name
+add_retry(): counts a retry for the spans currently opened in the thread
+add_bytes(nb): counts nb bytes received for the spans currently opened in the thread
+start_run(): starts a new refresh, the spans recorded before being dropped
+end_run(): ends the refresh, saving its spans in METRICS_FILENAME, returns the run
+summary(runs): returns the dict stage: {'count', 'mean', 'max', 'retries', 'bytes'} over runs (times in ms)
+
+
+SIDE EFFECTS:
+------------
+Stores the metrics of the last refreshes in METRICS_FILENAME
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from functools import wraps
+from json import dump, load
+from time import strftime, time
+from os import path, rename
+from sys import argv
+import threading
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+METRICS_FILENAME = PATH_PREFIX + "metrics_magicmirror.json"
+
+MAX_RUNS = 100  # Nb of refreshes kept in METRICS_FILENAME
+SUMMARY_RUNS = 10  # Nb of the last refreshes summarized
+
+verbose = False
+
+run_start = time()  # Start of the current refresh
+records = []  # Spans ended during the current refresh
+records_lock = threading.Lock()
+opened = threading.local()  # Spans currently opened, per thread
+
+
+#-------------------------------------------------
+#--- CLASSES -------------------------------------
+#-------------------------------------------------
+
+class Span(object):
+	"""
+		Measure of a stage, to be used as a context manager
+	"""
+
+	def __init__(self, name):
+		self.name = name
+		self.retries = 0
+		self.bytes = 0
+		self.start = 0
+
+	def __enter__(self):
+		stack().append(self)
+		self.start = time()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		duration = time() - self.start
+		stack().remove(self)
+		record = {
+			'name': self.name,
+			'start': round((self.start - run_start) * 1000, 1),
+			'time': round(duration * 1000, 1),
+			'retries': self.retries,
+			'bytes': self.bytes
+		}
+		if exc_type is not None:
+			record['error'] = exc_type.__name__
+		with records_lock:
+			records.append(record)
+		mm_log.log("...%s: %.0f ms, %s retries, %s bytes", verbose, mm_log.INFO, (self.name, record['time'], self.retries, self.bytes))
+		return False
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
+	"""
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
+	"""
+	mm_log.log(txt, verbose or forceprint, level, args)
+	return
+
+
+#-------------------------------------------------
+#		Span functions
+#-------------------------------------------------
+
+def stack():
+	"""
+		Returns the list of the spans opened in the current thread
+	"""
+	if not hasattr(opened, 'spans'):
+		opened.spans = []
+	return opened.spans
+
+
+def span(name):
+	"""
+		Returns a new span measuring the stage name
+	"""
+	return Span(name)
+
+
+def timed(name):
+	"""
+		Decorator measuring each call of the function as the stage name
+	"""
+	def decorator(function):
+		@wraps(function)
+		def measured(*args, **kwargs):
+			with Span(name):
+				return function(*args, **kwargs)
+		return measured
+	return decorator
+
+
+def add_retry():
+	"""
+		Counts a retry for the spans opened in the current thread
+	"""
+	for opened_span in stack():
+		opened_span.retries += 1
+	return
+
+
+def add_bytes(nb):
+	"""
+		Counts nb bytes received for the spans opened in the current thread
+	"""
+	for opened_span in stack():
+		opened_span.bytes += nb
+	return
+
+
+#-------------------------------------------------
+#		Run functions
+#-------------------------------------------------
+
+def start_run():
+	"""
+		Starts a new refresh
+	"""
+	global run_start
+
+	with records_lock:
+		del records[:]
+		run_start = time()
+	return
+
+
+def load_runs():
+	"""
+		Returns the runs saved in METRICS_FILENAME
+	"""
+	try:
+		with open(METRICS_FILENAME, 'r') as file:
+			return load(file).get('runs', [])
+	except Exception:
+		return []
+
+
+def summary(runs):
+	"""
+		Returns the summary, per stage, of runs (see module doc)
+	"""
+	stages = {}
+	for run in runs:
+		for record in run['spans']:
+			stage = stages.setdefault(record['name'], {'count': 0, 'total': 0, 'max': 0, 'retries': 0, 'bytes': 0})
+			stage['count'] += 1
+			stage['total'] += record['time']
+			stage['max'] = max(stage['max'], record['time'])
+			stage['retries'] += record['retries']
+			stage['bytes'] += record['bytes']
+	for name in stages:
+		stage = stages[name]
+		stage['mean'] = round(stage.pop('total') / stage['count'], 1)
+	return stages
+
+
+def end_run():
+	"""
+		Ends the current refresh and saves its spans with the previous runs, returns the run
+	"""
+	with records_lock:
+		run = {
+			'date': strftime('%Y/%m/%d %H:%M:%S'),
+			'time': round((time() - run_start) * 1000, 1),
+			'spans': list(records)
+		}
+		del records[:]
+	if run['spans'] == []:
+		return run
+	tolog("Refresh measured: %.0f ms, %s stages", args=(run['time'], len(run['spans'])))
+
+	runs = (load_runs() + [run])[-MAX_RUNS:]
+	try:
+		with open(METRICS_FILENAME + '.tmp', 'w') as file:
+			dump({'runs': runs, 'summary': summary(runs[-SUMMARY_RUNS:])}, file)
+		rename(METRICS_FILENAME + '.tmp', METRICS_FILENAME)
+	except Exception as e:
+		tolog("...error saving metrics: %s", True, mm_log.ERROR, (e,))
+	return run
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	nb = SUMMARY_RUNS
+	if len(argv) > 2 and argv[1] == '-n':
+		nb = int(argv[2])
+
+	runs = load_runs()[-nb:]
+	print("Summary of the last %s refreshes (times in ms)" % (len(runs)))
+	if runs:
+		print("Refresh: mean %.0f, max %.0f" % (sum(run['time'] for run in runs) / len(runs), max(run['time'] for run in runs)))
+	stages = summary(runs)
+	for name in sorted(stages, key=lambda name: -stages[name]['mean']):
+		stage = stages[name]
+		print("%-24s %5s calls, mean %7.0f, max %7.0f, %4s retries, %9s bytes" % (
+			name, stage['count'], stage['mean'], stage['max'], stage['retries'], stage['bytes']))
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
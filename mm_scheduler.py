@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_scheduler.py						#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_scheduler.py"
+
+"""
+Version: 17/10/26
+
+Scheduler of the refresh of the data sources of the magic mirror (weather, forecast, tide, calendar...):
+each source is refreshed according to its own refresh policy, which follows how often its data changes,
+and only the sources which are due are fetched on each tick
+
+The state of the scheduler (last fetch time and data of each source) can be saved to a file,
+so that the one-shot runs launched by cron also fetch only the sources which are due
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Added refresh policies (EveryPolicy, AlignedPolicy, DailyPolicy) and state file
+- Failed fetches signalled by FAILED, so that an empty result (eg no event) replaces the previous data
+
+
+USAGE:
+-----
+From another python program:
+scheduler = Scheduler(state_filename)
+scheduler.add(name, policy, function, args, default): registers the source name, to be fetched with function(*args)
+	according to policy (either a policy object or an interval in seconds), default being the data of the source
+	until it is fetched successfully
+scheduler.tasks_due(): returns the dict name: (function, args, default) of the sources to be fetched now
+scheduler.update(results): stores the fetched results (dict name: result, FAILED if the fetch failed, in which case
+	the previous data is kept and the source is fetched again after FAILURE_DELAY), returns True if some data has changed
+scheduler.data(): returns the dict name: latest data of each source
+scheduler.next_delay(): returns the delay in seconds before the next source is due
+scheduler.save(): saves the state of the scheduler to the state file
+
+Refresh policies:
+EveryPolicy(interval): refresh every interval seconds
+AlignedPolicy(step, offset): refresh once per step, at times aligned on multiples of step (+ offset) seconds since epoch
+DailyPolicy(hour): refresh once a day, at hour (local time)
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+import pickle
+from time import time, mktime
+from datetime import datetime, timedelta
+from os import path, rename
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+FAILURE_DELAY = 5 * 60  # Delay before fetching again a source whose fetch failed, in seconds
+
+FAILED = None  # Result of a failed fetch, to be returned by the fetching functions
+
+
+#-------------------------------------------------
+#--- CLASSES -------------------------------------
+#-------------------------------------------------
+
+class EveryPolicy(object):
+	"""
+		Refresh every interval seconds
+	"""
+
+	def __init__(self, interval):
+		self.interval = interval
+
+	def next_due(self, last):
+		return last + self.interval
+
+
+class AlignedPolicy(object):
+	"""
+		Refresh once per step seconds, on multiples of step (+ offset) since epoch,
+		eg step = 3 hours for the 3-hour forecast of OpenWeather
+	"""
+
+	def __init__(self, step, offset=0):
+		self.step = step
+		self.offset = offset
+
+	def next_due(self, last):
+		return ((last - self.offset) // self.step + 1) * self.step + self.offset
+
+
+class DailyPolicy(object):
+	"""
+		Refresh once a day at hour (local time), eg for today's tide
+	"""
+
+	def __init__(self, hour=0):
+		self.hour = hour
+
+	def next_due(self, last):
+		last_time = datetime.fromtimestamp(last)
+		due_time = last_time.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+		if due_time <= last_time:
+			due_time += timedelta(days=1)
+		return mktime(due_time.timetuple())
+
+
+class Scheduler(object):
+	"""
+		Keeps the latest data of each source and tells which sources are due
+	"""
+
+	def __init__(self, state_filename=None):
+		self.sources = {}  # name: (policy, function, args, default)
+		self.state_filename = state_filename
+		self.state = {}  # name: {'args': ..., 'last_run': ..., 'data': ...}
+		self.retry_at = {}  # name: time after which a failed fetch may be attempted again
+		if state_filename is not None:
+			self.load()
+
+	def load(self):
+		try:
+			if path.exists(self.state_filename):
+				with open(self.state_filename, 'rb') as file:
+					self.state = pickle.load(file)
+		except Exception:
+			self.state = {}
+		return
+
+	def save(self):
+		if self.state_filename is None:
+			return
+		with open(self.state_filename + '.tmp', 'wb') as file:
+			pickle.dump(self.state, file)
+		rename(self.state_filename + '.tmp', self.state_filename)
+		return
+
+	def add(self, name, policy, function, args=(), default=None):
+		if not hasattr(policy, 'next_due'):
+			policy = EveryPolicy(policy)
+		self.sources[name] = (policy, function, args, default)
+		if name in self.state and self.state[name]['args'] != args:
+			del self.state[name]  # Stored data was fetched for other parameters
+		return
+
+	def due_time(self, name):
+		if name not in self.state:
+			due = 0
+		else:
+			due = self.sources[name][0].next_due(self.state[name]['last_run'])
+		return max(due, self.retry_at.get(name, 0))
+
+	def tasks_due(self, now=None):
+		if now is None:
+			now = time()
+		tasks = {}
+		for name in self.sources:
+			if self.due_time(name) <= now:
+				policy, function, args, default = self.sources[name]
+				tasks[name] = (function, args, default)
+		return tasks
+
+	def update(self, results, now=None):
+		if now is None:
+			now = time()
+		changed = False
+		for name in results:
+			if results[name] is FAILED:
+				self.retry_at[name] = now + FAILURE_DELAY  # Keep the previous data (or the default)
+				continue
+			self.retry_at.pop(name, None)
+			if name not in self.state or self.state[name]['data'] != results[name]:
+				changed = True
+			self.state[name] = {'args': self.sources[name][2], 'last_run': now, 'data': results[name]}
+		return changed
+
+	def data(self):
+		data = {}
+		for name in self.sources:
+			if name in self.state:
+				data[name] = self.state[name]['data']
+			else:
+				data[name] = self.sources[name][3]
+		return data
+
+	def next_delay(self, now=None):
+		if now is None:
+			now = time()
+		delay = None
+		for name in self.sources:
+			remaining = self.due_time(name) - now
+			if delay is None or remaining < delay:
+				delay = remaining
+		return max(0, delay or 0)
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
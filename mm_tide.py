@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				mm_tide.py							#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "mm_tide.py"
+
+"""
+Version: 17/10/26
+
+Local prediction of the tides of the magic mirror, from the harmonic constituents of the ports
+
+The height of the tide is computed as the sum of the harmonic constituents of the port stored in PORTS_FILENAME
+(amplitude and phase of each constituent, corrected with the nodal factors of the year), over a grid of times
+spaced by STEP seconds: the computation is vectorized with numpy, so that a day or several weeks of tides are
+predicted in a few milliseconds, without any network access. The high and low waters are the extrema of the grid,
+refined by parabolic interpolation, and the coefficient of a tide is computed from the height of its high water,
+as 100 * (height - z0) / unit (unit being the height unit of the port, 3.05 m for Brest).
+
+A port is added with an entry of PORTS_FILENAME: {"NAME": {"z0": mean level, "unit": height unit,
+"constituents": {"M2": [amplitude, phase], ...}}}, with the heights in meters and the phases in degrees (UTC).
+
+LIMITATIONS:
+The local prediction is opt-in: PORTS_FILENAME is provided empty, so that all the tides are fetched from horaire-maree.fr
+by mm_data.get_tide until the constants of a port are added to it. resources/tide_ports.example.json gives the port of Brest as an
+example, with approximate values of its main constituents (not checked against the official SHOM constants): its predicted
+times and coefficients may differ from the official tide tables. The entry of a port should only be copied to
+PORTS_FILENAME with constants checked against an official source (eg published by the SHOM for the French ports),
+and its predictions compared with the official tide tables.
+
+HISTORY:
+--------
+17/10/26:
+- Initial program
+- Local prediction opt-in: ports file provided empty, the port of Brest moved to the example file
+
+
+USAGE:
+-----
+From another python program:
+get_port(name): returns the constants of the port name (case insensitive), or None if unknown
+heights(port, times): returns the heights of the tide of port at the times (array of times)
+extrema(port, start, end): returns the high and low waters of port between the times start and end,
+	as a list of (time, height, high)
+coefficient(port, height): returns the coefficient of the high water of port at height
+get_tide(name, day=None): returns tide_hours, tide_coef for the port name and the day (default today), as mm_data.get_tide,
+	or None if the port is unknown or numpy is not installed
+
+From the shell:
+python mm_tide.py [-port Name] [-days nb] [-ports filename]: prints the high and low waters of the port (default BREST)
+	for the next nb days, with the constants of the ports file (default PORTS_FILENAME, eg resources/tide_ports.example.json)
+
+
+PREREQUISITS:
+------------
+Requires in resources directory the file:
+- tide_ports.json : harmonic constituents of the ports (empty by default, see LIMITATIONS and tide_ports.example.json)
+
+Installation of the lib:
+	pip install numpy
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+from datetime import date, timedelta
+from json import load
+from time import localtime, mktime, strftime, time
+from os import path
+from sys import argv
+import mm_log
+
+
+#-------------------------------------------------
+#--- DEFINITIONS ---------------------------------
+#-------------------------------------------------
+
+PATH_PREFIX = path.dirname(path.abspath(__file__)) + '/'
+PORTS_FILENAME = PATH_PREFIX + "resources/tide_ports.json"
+
+STEP = 60  # Spacing of the time grid, in seconds
+MARGIN = 3600  # Extension of the time grid before and after the requested period, so that its edge extrema are found
+
+# Astronomical argument of each constituent: coefficients of (T, s, h, p) and offset in degrees (Schureman), with
+# T the hour angle of the mean sun, s, h and p the mean longitudes of the moon, of the sun and of the lunar perigee
+CONSTITUENTS = {
+	'M2': (2, -2, 2, 0, 0),
+	'S2': (2, 0, 0, 0, 0),
+	'N2': (2, -3, 2, 1, 0),
+	'K2': (2, 0, 2, 0, 0),
+	'NU2': (2, -3, 4, -1, 0),
+	'MU2': (2, -4, 4, 0, 0),
+	'2N2': (2, -4, 2, 2, 0),
+	'K1': (1, 0, 1, 0, -90),
+	'O1': (1, -2, 1, 0, 90),
+	'P1': (1, 0, -1, 0, 90),
+	'Q1': (1, -3, 1, 1, 90),
+	'M4': (4, -4, 4, 0, 0),
+	'MS4': (4, -2, 2, 0, 0),
+	'MN4': (4, -5, 4, 1, 0),
+	'M6': (6, -6, 6, 0, 0),
+}
+
+# Nodal correction of each constituent: the one of M2, K2, K1, O1 raised to a power, or none
+NODAL = {
+	'M2': ('M2', 1), 'N2': ('M2', 1), 'NU2': ('M2', 1), 'MU2': ('M2', 1), '2N2': ('M2', 1),
+	'K2': ('K2', 1), 'K1': ('K1', 1), 'O1': ('O1', 1), 'Q1': ('O1', 1),
+	'M4': ('M2', 2), 'MS4': ('M2', 1), 'MN4': ('M2', 2), 'M6': ('M2', 3),
+}
+
+verbose = False
+
+np = None  # numpy, imported on first prediction
+ports = None  # Constants of the ports, loaded from PORTS_FILENAME on first use
+
+
+#-------------------------------------------------
+#--- FUNCTIONS -----------------------------------
+#-------------------------------------------------
+
+def tolog(txt, forceprint=False, level=mm_log.INFO, args=()):
+	"""
+		Logs the event txt % args (through the buffer of mm_log) at level, and prints it if verbose or forceprint
+	"""
+	mm_log.log(txt, verbose or forceprint, level, args)
+	return
+
+
+def import_numpy():
+	"""
+		Imports numpy on first call, returns False if it is not installed
+	"""
+	global np
+
+	if np is None:
+		try:
+			import numpy
+		except ImportError:
+			tolog("...numpy not installed, no local tide prediction")
+			return False
+		np = numpy
+	return True
+
+
+def get_port(name):
+	"""
+		Returns the constants of the port name, or None if unknown
+	"""
+	global ports
+
+	if ports is None:
+		try:
+			with open(PORTS_FILENAME, 'r') as file:
+				ports = load(file)
+		except Exception as e:
+			tolog("...error loading tide ports: %s", True, mm_log.ERROR, (e,))
+			ports = {}
+	return ports.get(name.upper())
+
+
+#-------------------------------------------------
+#		Prediction functions
+#-------------------------------------------------
+
+def astronomical_arguments(times):
+	"""
+		Returns the array (len(times), 5) of T, s, h, p (degrees) and 1, and the longitude N of the lunar node (degrees)
+	"""
+	centuries = (times / 86400.0 + 2440587.5 - 2451545.0) / 36525.0  # From J2000
+	hour_angle = 180.0 + 360.0 * (times % 86400) / 86400.0
+	s = 218.3164477 + 481267.88123421 * centuries
+	h = 280.46646 + 36000.76983 * centuries
+	p = 83.3532465 + 4069.0137287 * centuries
+	node = 125.04452 - 1934.136261 * centuries
+	return np.column_stack((hour_angle, s, h, p, np.ones_like(times))), node
+
+
+def nodal_corrections(node):
+	"""
+		Returns the nodal factors f and angles u (degrees) of M2, K2, K1 and O1 for the longitudes node of the lunar node
+	"""
+	n = np.radians(node)
+	return {
+		'M2': (1.0004 - 0.0373 * np.cos(n) + 0.0002 * np.cos(2 * n),
+			-2.14 * np.sin(n)),
+		'K2': (1.0241 + 0.2863 * np.cos(n) + 0.0083 * np.cos(2 * n) - 0.0015 * np.cos(3 * n),
+			-17.74 * np.sin(n) + 0.68 * np.sin(2 * n) - 0.04 * np.sin(3 * n)),
+		'K1': (1.0060 + 0.1150 * np.cos(n) - 0.0088 * np.cos(2 * n) + 0.0006 * np.cos(3 * n),
+			-8.86 * np.sin(n) + 0.68 * np.sin(2 * n) - 0.07 * np.sin(3 * n)),
+		'O1': (1.0089 + 0.1871 * np.cos(n) - 0.0147 * np.cos(2 * n) + 0.0014 * np.cos(3 * n),
+			10.80 * np.sin(n) - 1.34 * np.sin(2 * n) + 0.19 * np.sin(3 * n)),
+	}
+
+
+def heights(port, times):
+	"""
+		Returns the heights of the tide of port at the times (array of times), in meters above chart datum
+	"""
+	names = [name for name in port['constituents'] if name in CONSTITUENTS]
+	amplitudes = np.array([port['constituents'][name][0] for name in names], dtype=float)
+	phases = np.array([port['constituents'][name][1] for name in names], dtype=float)  # Corrected in place below
+
+	arguments, node = astronomical_arguments(np.asarray(times, dtype=float))
+	angles = arguments.dot(np.array([CONSTITUENTS[name] for name in names], dtype=float).T)  # (times, constituents)
+
+	# The node moves by 0.05 degree a day: its corrections are taken at the middle of the period
+	corrections = nodal_corrections(node[len(node) // 2])
+	factors = np.ones(len(names))
+	for i, name in enumerate(names):
+		if name in NODAL:
+			reference, power = NODAL[name]
+			f, u = corrections[reference]
+			factors[i] = f ** power
+			phases[i] -= u * power
+	return port['z0'] + np.cos(np.radians(angles - phases)).dot(amplitudes * factors)
+
+
+def extrema(port, start, end):
+	"""
+		Returns the high and low waters of port between the times start and end, as a list of (time, height, high)
+	"""
+	times = np.arange(start - MARGIN, end + MARGIN + STEP, STEP, dtype=float)
+	values = heights(port, times)
+	slopes = np.sign(np.diff(values))
+	turns = np.nonzero(slopes[:-1] != slopes[1:])[0] + 1  # Indexes where the tide turns
+
+	# Parabolic interpolation of each extremum with its two neighbours
+	before, at, after = values[turns - 1], values[turns], values[turns + 1]
+	curvature = before - 2 * at + after
+	shift = np.where(curvature != 0, 0.5 * (before - after) / np.where(curvature != 0, curvature, 1), 0)
+	turn_times = times[turns] + shift * STEP
+	turn_heights = at - 0.25 * (before - after) * shift
+
+	return [(float(t), float(height), bool(high)) for t, height, high in zip(turn_times, turn_heights, curvature < 0)
+		if start <= t < end]
+
+
+def coefficient(port, height):
+	"""
+		Returns the coefficient of the high water of port at height
+	"""
+	return int(round(100 * (height - port['z0']) / port['unit']))
+
+
+#-------------------------------------------------
+#		Tide functions
+#-------------------------------------------------
+
+def get_tide(name, day=None):
+	"""
+		Returns tide_hours, tide_coef of the port name for the day (default today), as mm_data.get_tide,
+		or None if the port is unknown or numpy is not installed
+	"""
+	port = get_port(name)
+	if port is None:
+		tolog("...no harmonic constants for %s in %s", args=(name, path.basename(PORTS_FILENAME)))
+		return None
+	if not import_numpy():
+		return None
+
+	if day is None:
+		day = date.today()
+	start = mktime(day.timetuple())
+	end = mktime((day + timedelta(days=1)).timetuple())
+	high_waters = [(t, height) for t, height, high in extrema(port, start, end) if high]
+	if not high_waters:
+		return ([], '?')
+
+	tide_hours = [strftime('%H:%M', localtime(t)) for t, height in high_waters[:2]]
+	tide_coef = '%s' % (max(coefficient(port, height) for t, height in high_waters))
+	tolog("Tide predicted for %s: %s (coef %s)", args=(name, ', '.join(tide_hours), tide_coef))
+	if len(tide_hours) == 1:
+		tide_hours.append('')
+	return tide_hours, tide_coef
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	name = 'BREST'
+	days = 1
+	n = 1
+	while n + 1 < len(argv):
+		if argv[n] == '-port':
+			name = argv[n+1]
+		elif argv[n] == '-days':
+			days = int(argv[n+1])
+		elif argv[n] == '-ports':
+			PORTS_FILENAME = argv[n+1]
+		n += 2
+
+	port = get_port(name)
+	if port is None:
+		print("Unknown port %s" % (name))
+	elif not import_numpy():
+		print("numpy is required")
+	else:
+		start = mktime(date.today().timetuple())
+		chrono = time()
+		tides = extrema(port, start, start + days * 86400)
+		print("%s tides computed in %.1f ms" % (len(tides), (time() - chrono) * 1000))
+		for t, height, high in tides:
+			print("%s  %s  %5.2f m%s" % (strftime('%Y/%m/%d %H:%M', localtime(t)), 'PM' if high else 'BM', height,
+				"  (%s)" % (coefficient(port, height)) if high else ''))
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
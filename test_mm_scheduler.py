@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#													#
+#				test_mm_scheduler.py				#
+#				by N.Mercouroff						#
+#													#
+#---------------------------------------------------#
+
+version_prog = "261017"
+name_prog = "test_mm_scheduler.py"
+
+"""
+Version: 17/10/26
+
+Tests of the storage of the fetched results by mm_scheduler
+
+USAGE:
+-----
+From the shell:
+python -m unittest test_mm_scheduler
+
+"""
+
+
+#-------------------------------------------------
+#--- IMPORTS -------------------------------------
+#-------------------------------------------------
+
+import unittest
+import mm_scheduler
+
+
+#-------------------------------------------------
+#--- CLASSES -------------------------------------
+#-------------------------------------------------
+
+class UpdateTest(unittest.TestCase):
+
+	def setUp(self):
+		self.scheduler = mm_scheduler.Scheduler()
+		self.scheduler.add('calendar', 300, None, (), [])
+		self.scheduler.update({'calendar': ['event']}, now=1000)
+
+	def test_empty_result_replaces_data(self):
+		self.assertTrue(self.scheduler.update({'calendar': []}, now=1300))
+		self.assertEqual(self.scheduler.data()['calendar'], [])
+		self.assertEqual(self.scheduler.next_delay(now=1300), 300)
+
+	def test_failed_fetch_keeps_data(self):
+		self.assertFalse(self.scheduler.update({'calendar': mm_scheduler.FAILED}, now=1300))
+		self.assertEqual(self.scheduler.data()['calendar'], ['event'])
+		self.assertEqual(self.scheduler.next_delay(now=1300), mm_scheduler.FAILURE_DELAY)
+
+	def test_failed_first_fetch_gives_default(self):
+		scheduler = mm_scheduler.Scheduler()
+		scheduler.add('calendar', 300, None, (), [])
+		scheduler.update({'calendar': mm_scheduler.FAILED}, now=1000)
+		self.assertEqual(scheduler.data()['calendar'], [])
+		self.assertEqual(scheduler.tasks_due(now=1000), {})
+		self.assertIn('calendar', scheduler.tasks_due(now=1000 + mm_scheduler.FAILURE_DELAY))
+
+
+#-------------------------------------------------
+#		Main
+#-------------------------------------------------
+
+if __name__ == "__main__":
+	unittest.main()
+
+
+#-------------------------------------------------
+#----- END OF THE PROGRAMME ----------------------
+#-------------------------------------------------
@@ -15,6 +15,9 @@ Python program for fetching weather info on openweather web server and tide info
 
 HISTORY:
 --------
+17/10/26:
+- Logging through the buffered logger of mm_log
+
 18/2/19:
 - Added -tide option to shell command to force display of tide information
 
@@ -82,6 +85,7 @@ import sys
 from datetime import datetime
 from requests import get
 from urllib2 import Request, urlopen, URLError
+import mm_log
 
 #-------------------------------------------------
 #--- DEFINITIONS ---------------------------------
@@ -188,12 +192,9 @@ COUNTRY_DEFAULT = "Fr"
 
 
 def tolog(txt):
-	now = strftime('%Y/%m/%d %H:%M:%S')
-	msg = "%s\t%s" % (now, txt)
 	if verbose:
-		print(msg)
-	with open(LOG_FILENAME, 'a') as file:
-		file.write(msg + "\n")
+		print("%s\t%s" % (strftime('%Y/%m/%d %H:%M:%S'), txt))
+	mm_log.log(txt, False, mm_log.INFO, (), LOG_FILENAME)
 	return
 
 